@@ -1,9 +1,13 @@
 import pya
 import math
 import cmath
+import numpy
 from pya import *
-from SiEPIC.utils import get_technology, get_technology_by_name
+from SiEPIC.utils import get_technology, get_technology_by_name, points_per_circle
 from SiEPIC.scripts import path_to_waveguide
+from pcell_utils.cache import cached_array
+from pcell_utils.emission import insert_ribbon
+from pcell_utils.technology import cached_technology
 
 MODULE_NUMPY = True
 
@@ -15,7 +19,7 @@ alpha = 1 #related to the spirals radius growth, can only guess and test so far
 
 r = 25.0 #radius of the Sbend spiral
 gap = 8.0 #gap between wgs
-angle_stepsize = 0.0001 #0.00001 required for less than 1 nm error
+grating_tolerance = 0.001 #nm, max error of each grating length found by angle_from_corrugation
 
 # Create aliases for KLayout Python API methods:
 Box = pya.Box
@@ -28,283 +32,138 @@ LayerInfo = pya.LayerInfo
 ###################################
 
 #General Spiral Calculation Functions#
-def frange(start,stop,step):
-  #Used to define a float range, since python doesnt have a built in one
-  x = start
-  while x <stop:
-      yield x #returns value as generator, speeding up stuff
-      x+=step
-        
+def spiral_point(r, angle):
+    #Centre line of the spiral at the given angle, as a complex number
+    deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha)
+    r_spiral = (r*sign(angle))+(gap*angle/pi)
+    return (r_spiral*cmath.exp(j*abs(angle)))-deltaX
+
+def spiral_slope(r, angle):
+    #Derivative dS/dangle of the centre line, its magnitude is the arc length per radian
+    #S = (r*s+gap*angle/pi)*exp(j*|angle|) - r*s*exp(-|angle|/alpha), with s = sign(angle)
+    s = sign(angle)
+    r_spiral = (r*s)+(gap*angle/pi)
+    return (gap/pi+j*s*r_spiral)*cmath.exp(j*abs(angle)) + (r/alpha)*cmath.exp(-abs(angle)/alpha)
+
+def next_grating_angle(r, angle, S1, grating_length):
+    #Finds the angle after the given one at which the spiral is grating_length away from the point S1,
+    #to within grating_tolerance. The first guess follows the arc length, then Newton's method on the chord
+    tolerance = grating_tolerance*1e-3 #um
+    angle_next = angle + grating_length/abs(spiral_slope(r, angle))
+    for i in range(50):
+        chord = spiral_point(r, angle_next) - S1
+        error = abs(chord) - grating_length
+        if abs(error) < tolerance:
+            break
+        angle_next -= error*abs(chord)/(chord.conjugate()*spiral_slope(r, angle_next)).real
+    return angle_next
+
 def angle_from_corrugation(r, length, grating_length):
     #Calculates the thetas at which the desired grating lengths are achieved. Outputs to an array    
     angle = 0
-    current_length = 0
-    x1=0
-    y1=0
+    S1 = spiral_point(r, angle)
     current_total_length=0
     yield angle#yield acts as a return but gives a generator. This early yield is to return the 0 value
     
     while current_total_length < length+grating_length: #The spiral gen doesnt draw the last grating because it needs to calculate slope, thus we draw an extra
-        while current_length < grating_length: #if the length has no reached the grating length, continue
-            deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha)    
-            r_spiral = (r*sign(angle))+(gap*angle/pi)
-            S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX
-            x2 = S.real
-            y2= S.imag
-            
-            angle += angle_stepsize #continue to increase step size
-            current_length = math.sqrt((x2-x1)**2+(y2-y1)**2) #figureout of the distance betweenthe two points
-        #print("currentLength"+str(current_length))
-        #print("targetlength"+str(grating_length))
+        angle = next_grating_angle(r, angle, S1, grating_length)
         yield angle
-        x1=S.real
-        y1=S.imag
-        current_total_length +=current_length
-        current_length=0
+        S2 = spiral_point(r, angle)
+        current_total_length += abs(S2-S1)
+        S1 = S2
         
-def spiral_gen(r,angle_array,w,cwidth,grating_length):
-    #This generates the spirals coordinates from the given angle arrays. Given there is a cwidth
-    
-    for i in frange(0,len(angle_array)-1,1):
-      angle=angle_array[i]
-      angle_next=angle_array[i+1]
-      
-      #Calculate Slope to ensure the gratings are 90 degree with the center guide line, note that the final point will be ignored here and appeneded later
-      deltaX = (r*sign(angle_next))*cmath.exp(-abs(angle_next)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #Second Point
-      r_spiral = (r*sign(angle_next))+(gap*angle_next/pi)
-      S = (r_spiral*cmath.exp(j*abs(angle_next)))-deltaX   
-      x2 = S.real
-      y2 = S.imag
-      deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #First Point
-      r_spiral = (r*sign(angle))+(gap*angle/pi)
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX
-      x1 = S.real
-      y1 = S.imag 
-      #Slope
-      if (grating_length != 0):
-        dx = (x2-x1)/grating_length
-        dy = (y2-y1)/grating_length
-      else:
-        print ("Grating_Length is 0, use legacy function")
-
-      #Calculate the Coordinate for each grating and apply the slope modifer  
-      #Outer, C1
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX    
-      xcoor_Winc1 = S.real+dy*(w+cwidth)
-      ycoor_Winc1 = S.imag-dx*(w+cwidth)     
-      #Outer C2
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc2 = S.real+dy*(w-cwidth)
-      ycoor_Winc2 = S.imag-dx*(w-cwidth)
-      #Inner, C1
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc3 = S.real-dy*(w-cwidth)
-      ycoor_Winc3 = S.imag+dx*(w-cwidth)
-      #Inner C2
-
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc4 = S.real-dy*(w+cwidth)
-      ycoor_Winc4 = S.imag+dx*(w+cwidth)
-      
-      if cwidth!=0:  
-        yield xcoor_Winc1,ycoor_Winc1,xcoor_Winc2,ycoor_Winc2,xcoor_Winc3,ycoor_Winc3,xcoor_Winc4,ycoor_Winc4,dx,dy
-      else:
-        yield xcoor_Winc1,ycoor_Winc1,xcoor_Winc3,ycoor_Winc3,dx,dy
-                        
-    
-def sort_coord(bool_order,xinc,yinc,xdec,ydec):
-    #this organizes the two sets of coordinates for each wall into an order to create gratings
-    #can pass bool_order to decide which gets drawn first
-    x_array=[]
-    y_array=[]
-    
-    for i in range(len(xinc)):
-        if bool_order == True:
-            x_array.append(xdec[i])
-            x_array.append(xinc[i])
-            y_array.append(ydec[i])
-            y_array.append(yinc[i])
-            bool_order = not bool_order
-        else:
-            x_array.append(xinc[i])
-            x_array.append(xdec[i])
-            y_array.append(yinc[i])
-            y_array.append(ydec[i])
-            bool_order = not bool_order
-    return x_array,y_array            
-       
-def finish_spiral(r,finalangle,w,dx,dy):
+def spiral_points(r, angles, offset=0):
+    #Vectorized spiral_point for an array of angles, returns a complex array
+    #offset moves the radius but not deltaX, as for the walls of the uniform waveguide in finish_spiral
+    angles = numpy.asarray(angles, dtype=numpy.float64)
+    s = numpy.copysign(1, angles)
+    deltaX = (r*s)*numpy.exp(-numpy.abs(angles)/alpha)
+    r_spiral = ((r+offset)*s)+(gap*angles/pi)
+    return (r_spiral*numpy.exp(j*numpy.abs(angles)))-deltaX
+
+def as_points(S):
+    #Complex coordinates to a contiguous float64 array of points, [[x0, y0], [x1, y1], ...]
+    return numpy.ascontiguousarray(S, dtype=numpy.complex128).view(numpy.float64).reshape(-1, 2)
+
+def zigzag(first, second):
+    #Alternates between two walls to draw the gratings: first[0], second[0], second[1], first[1], first[2], ...
+    S = numpy.empty((len(first), 2), dtype=numpy.complex128)
+    S[0::2, 0] = first[0::2]
+    S[0::2, 1] = second[0::2]
+    S[1::2, 0] = second[1::2]
+    S[1::2, 1] = first[1::2]
+    return S.ravel()
+
+def grating_frame(r, angle_array, grating_length, start=0):
+    #Center line points of the gratings at angle_array[start:-1], and their slopes (dx, dy) along the chord to the
+    #next grating. The walls are drawn along the normal -j*slope = (dy, -dx), i.e. at 90 degree to the chord
+    if grating_length == 0:
+        raise Exception("Grating_Length is 0, use legacy function")
+    S = spiral_points(r, angle_array[start:])
+    slope = numpy.diff(S)/grating_length
+    return S[:-1], slope
+
+def spiral_walls(r, angle_array, w, cwidth, grating_length, start=0, phase=True):
+    #This generates the spirals wall coordinates for the gratings at angle_array[start:-1]. The walls are drawn
+    #at w from the center line, at 90 degree to the chord to the next grating.
+    #With a cwidth, each wall alternates between w-cwidth and w+cwidth, starting on the narrow side if phase is
+    #True and on the wide side otherwise. Without one, there is a single point per grating on each wall.
+    #Returns the outer and inner walls as float64 arrays of points, and the slope (dx, dy) of the last grating.
+    #The other half of the spiral is the negative of these arrays.
+    S, slope = grating_frame(r, angle_array, grating_length, start)
+    normal = -j*slope #towards the outer wall
+    if cwidth != 0:
+        narrow = normal*(w-cwidth)
+        wide = normal*(w+cwidth)
+        if not phase:
+            narrow, wide = wide, narrow
+        outer = zigzag(S+narrow, S+wide)
+        inner = zigzag(S-narrow, S-wide)
+    else:
+        outer = S+normal*w
+        inner = S-normal*w
+    return as_points(outer), as_points(inner), slope[-1].real, slope[-1].imag
+
+def CDC_walls(r, angle_array, w, w2, cwidth, cwidth2, grating_length, wgap, direction, phase=True):
+    #This generates the walls of the two coupled waveguides of the contra-DC, for the gratings at angle_array[:-1]
+    #Waveguide 1 is centered at wgap+w+cwidth outside the center line and waveguide 2 at wgap+w2+cwidth2 inside it.
+    #The gratings shift the waveguides sideways, alternately by +-cwidth and +-cwidth2 in opposite directions,
+    #starting with direction*cwidth for waveguide 1 if phase is True (the other way round otherwise)
+    #Returns the outer and inner walls of waveguide 1 and of waveguide 2 as float64 arrays of points,
+    #and the slope (dx, dy) of the last grating
+    S, slope = grating_frame(r, angle_array, grating_length)
+    normal = -j*slope
+    shift = direction*cwidth if phase else -direction*cwidth
+    shift2 = -direction*cwidth2 if phase else direction*cwidth2
+    walls = []
+    for center, width, s in ((wgap+w+cwidth, w, shift), (-(wgap+w2+cwidth2), w2, shift2)):
+        for offset in (center+width, center-width):
+            walls.append(as_points(zigzag(S+normal*(offset+s), S+normal*(offset-s))))
+    return walls[0], walls[1], walls[2], walls[3], slope[-1].real, slope[-1].imag
+
+def finish_spiral(r,finalangle,w,dx,dy,offset=0):
     #This finishes the spiral to the 0 or 180 position with a uniform waveguide, also makes it easier to match via pins
-    #The radius of the individual walls, basically draws 2 lines for each wall of the waveguide and appends hte points
-    r_Winc = r+w
-    r_Wdec = r-w
-    
-    x_inc=[]
-    y_inc=[]
-    x_dec=[]
-    y_dec=[]
-    
-    deltaX = (r*sign(finalangle))*cmath.exp(-abs(finalangle)/alpha)    
-    r_spiral = (r*sign(finalangle))+(gap*finalangle/pi)
-    S = (r_spiral*cmath.exp(j*abs(finalangle)))-deltaX  
-    x_inc.append(S.real+dy*w)
-    y_inc.append(S.imag-dx*w)
-        
-    r_spiral = (r*sign(finalangle))+(gap*finalangle/pi)
-    S = (r_spiral*cmath.exp(j*abs(finalangle)))-deltaX  
-    x_dec.append(S.real-dy*w)
-    y_dec.append(S.imag+dx*w)
-
-    nextpie = math.ceil(finalangle/ (pi)) * pi        
-    for angle in frange(finalangle+0.01,nextpie,0.01):
-        deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha)
-        
-        r_spiral = (r_Winc*sign(angle))+(gap*angle/pi)
-        S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX  
-        x_inc.append(S.real)
-        y_inc.append(S.imag)
-        
-        r_spiral = (r_Wdec*sign(angle))+(gap*angle/pi)
-        S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX  
-        x_dec.append(S.real)
-        y_dec.append(S.imag)
-        
-    #appends the final coordinate at y=0
-    deltaX = (r*sign(nextpie))*cmath.exp(-abs(nextpie)/alpha)
-    r_spiral = (r_Winc*sign(nextpie))+(gap*nextpie/pi)
-    S = (r_spiral*cmath.exp(j*abs(nextpie)))-deltaX 
-    x_inc.append(S.real)
-    y_inc.append(S.imag)
-    
-    deltaX = (r*sign(nextpie))*cmath.exp(-abs(nextpie)/alpha)
-    r_spiral = (r_Wdec*sign(nextpie))+(gap*nextpie/pi)
-    S = (r_spiral*cmath.exp(j*abs(nextpie)))-deltaX 
-    x_dec.append(S.real)
-    y_dec.append(S.imag)
-
-    #deltaX = (r*sign(nextpie))*cmath.exp(-abs(nextpie)/alpha)
-    #r_spiral = (r*sign(nextpie))+(gap*nextpie/pi)
-    #S = (r_spiral*cmath.exp(j*abs(nextpie)))-deltaX 
-    #endx = S.real
-
-    #if math.ceil(nextpie/pi) %2 ==0:
-      #isEven = True
-      #print ("even")
-      #print (nextpie)
-      #print (math.ceil(nextpie/pi) %2)
-    #else:
-      #isEven = False
-      #print ("odd")
-      #print (nextpie)
-      #print (math.ceil(nextpie/pi) %2)
-    
-    return x_inc,y_inc,x_dec,y_dec#,endx,isEven
-    
-def spiral_gen_NoCenter(r,angle_array,w,cwidth,grating_length):
-    #This generates the spirals coordinates from the given angle arrays. Given there is a cwidth
-    #for i in frange(0,len(angle_array)-1,1):
-    i = 0
-    angle = 0
-    xc1 = []
-    xc2 = []
-    yc1 = []
-    yc2 = []
-
-    while (angle<pi):
-      angle=angle_array[i]
-      angle_next=angle_array[i+1]
-      
-      #Calculate Slope to ensure the gratings are 90 degree with the center guide line, note that the final point will be ignored here and appeneded later
-      deltaX = (r*sign(angle_next))*cmath.exp(-abs(angle_next)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #Second Point
-      r_spiral = (r*sign(angle_next))+(gap*angle_next/pi)
-      S = (r_spiral*cmath.exp(j*abs(angle_next)))-deltaX    
-      x2 = S.real
-      y2 = S.imag
-      deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #First Point
-      r_spiral = (r*sign(angle))+(gap*angle/pi)
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX 
-      x1 = S.real
-      y1 = S.imag 
-      #Slope
-      if (grating_length != 0):
-        dx = (x2-x1)/grating_length
-        dy = (y2-y1)/grating_length
-      else:
-        print ("Grating_Length is 0, use legacy function")
-      #Calculate the Coordinate for each grating and apply the slope modifer  
-      #Outer, C1
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX    
-      xc1.append(S.real+dy*(w))
-      yc1.append(S.imag-dx*(w))
-      #Inner, C1
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX                 
-      xc2.append(S.real-dy*(w))
-      yc2.append(S.imag+dx*(w))
-      i+=1
-      
-    return xc1,yc1,xc2,yc2,i
-    
-def spiral_gen_NoCenter_Gratings(r,angle_array,w,cwidth,grating_length,lasti):
-    #This generates the spirals coordinates from the given angle arrays. Given there is a cwidth
+    #The walls start normal to the last grating (dx, dy), then follow the spiral with the radius widened by offset+-w
+    #(offset is the position of the waveguide from the center line, e.g. for the contra-DC)
+    #Returns the outer and inner walls as float64 arrays of points
+    S = spiral_point(r, finalangle)
+    normal = complex(dy, -dx)
+    nextpie = math.ceil(finalangle/ (pi)) * pi
+    angles = numpy.append(numpy.arange(finalangle+0.01, nextpie, 0.01), nextpie) #appends the final coordinate at y=0
+    outer = numpy.concatenate(([S+normal*(offset+w)], spiral_points(r, angles, offset+w)))
+    inner = numpy.concatenate(([S+normal*(offset-w)], spiral_points(r, angles, offset-w)))
+    return as_points(outer), as_points(inner)
+
+def spiral_ribbon(shapes, edge1, edge2, dbu=dbu):
+    #Inserts the outline between two walls, given as arrays of points in microns with edge1[k] facing edge2[k],
+    #as polygons in dbu. Long outlines are split into abutting polygons under the vertex limit
+    to_points = lambda edge: [Point.from_dpoint(DPoint(x, y)) for x, y in (edge/dbu).tolist()]
+    return insert_ribbon(shapes, to_points(edge1), to_points(edge2))
     
-    for i in frange(lasti,len(angle_array)-1,1):
-      angle=angle_array[i]
-      angle_next=angle_array[i+1]
-      
-      #Calculate Slope to ensure the gratings are 90 degree with the center guide line, note that the final point will be ignored here and appeneded later
-      deltaX = (r*sign(angle_next))*cmath.exp(-abs(angle_next)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #Second Point
-      r_spiral = (r*sign(angle_next))+(gap*angle_next/pi)
-      S = (r_spiral*cmath.exp(j*abs(angle_next)))-deltaX    
-      x2 = S.real
-      y2 = S.imag
-      deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #First Point
-      r_spiral = (r*sign(angle))+(gap*angle/pi)
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX 
-      x1 = S.real
-      y1 = S.imag 
-      #Slope
-      if (grating_length != 0):
-        dx = (x2-x1)/grating_length
-        dy = (y2-y1)/grating_length
-      else:
-        print ("Grating_Length is 0, use legacy function")
-
-      #Calculate the Coordinate for each grating and apply the slope modifer  
-      #Outer, C1
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX    
-      xcoor_Winc1 = S.real+dy*(w+cwidth)
-      ycoor_Winc1 = S.imag-dx*(w+cwidth)     
-      #Outer C2
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc2 = S.real+dy*(w-cwidth)
-      ycoor_Winc2 = S.imag-dx*(w-cwidth)
-      #Inner, C1
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc3 = S.real-dy*(w-cwidth)
-      ycoor_Winc3 = S.imag+dx*(w-cwidth)
-      #Inner C2
-
-      S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc4 = S.real-dy*(w+cwidth)
-      ycoor_Winc4 = S.imag+dx*(w+cwidth)
-      
-      if cwidth!=0:  
-        yield xcoor_Winc1,ycoor_Winc1,xcoor_Winc2,ycoor_Winc2,xcoor_Winc3,ycoor_Winc3,xcoor_Winc4,ycoor_Winc4,dx,dy
-      else:
-        yield xcoor_Winc1,ycoor_Winc1,xcoor_Winc3,ycoor_Winc3,dx,dy  
-        
 def angle_from_corrugation_NoCenter(r, length, grating_length):
     #Calculates the thetas at which the desired grating lengths are achieved. Outputs to an array    
     angle = 0
-    current_length = 0
-    x1=0
-    y1=0
+    S1 = spiral_point(r, angle)
     current_total_length=0
     
     ##
@@ -314,147 +173,63 @@ def angle_from_corrugation_NoCenter(r, length, grating_length):
     yield angle#yield acts as a return but gives a generator. This early yield is to return the 0 value
     
     while current_total_length < length+grating_length: #The spiral gen doesnt draw the last grating because it needs to calculate slope, thus we draw an extra
-        while current_length < grating_length: #if the length has no reached the grating length, continue
-            deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha)    
-            r_spiral = (r*sign(angle))+(gap*angle/pi)
-            S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX
-            x2 = S.real
-            y2= S.imag
-            
-            angle += angle_stepsize #continue to increase step size
-            current_length = math.sqrt((x2-x1)**2+(y2-y1)**2) #figureout of the distance betweenthe two points
-        #print("currentLength"+str(current_length))
-        #print("targetlength"+str(grating_length))
+        angle = next_grating_angle(r, angle, S1, grating_length)
         yield angle
-        x1=S.real
-        y1=S.imag
+        S2 = spiral_point(r, angle)
         if angle > pi:
-          current_total_length +=current_length
-        current_length=0
-
-def CDC_gen(r,angle_array,w,w2,cwidth,cwidth2,grating_length,wgap,direction):
-    #This generates the spirals coordinates from the given angle arrays. Given there is a cwidth
-    #iangle_array = [i*-1 for i in angle_array]
-    #angle_array = angle_array[::-1]
-    #angle_array.extend(iangle_array)
-    for i in frange(0,len(angle_array)-1,1):
-      angle=angle_array[i]
-      angle_next=angle_array[i+1]
-      #Calculate Slope to ensure the gratings are 90 degree with the center guide line, note that the final point will be ignored here and appeneded later
-      deltaX = (r*sign(angle_next))*cmath.exp(-abs(angle_next)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #Second Point
-      r_spiral = (r*sign(angle_next))+(gap*angle_next/pi)
-      S = ((r_spiral)*cmath.exp(j*abs(angle_next)))-deltaX   
-      x2 = S.real
-      y2 = S.imag
-      deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha) #r, not r_inc here because then it will all end at 0,0     
-      #First Point
-      r_spiral = (r*sign(angle))+(gap*angle/pi)
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX
-      x1 = S.real
-      y1 = S.imag 
-      #Slope
-      if (grating_length != 0):
-        dx = (x2-x1)/grating_length
-        dy = (y2-y1)/grating_length
-      else:
-        print ("Grating_Length is 0, use legacy function")
-      
-      #Calculate the Coordinate for each grating and apply the slope modifer
-      #WG1 
-      #Outer, C1
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX    
-      xcoor_Winc1 = S.real+dy*(w-direction*cwidth+wgap+w+cwidth)
-      ycoor_Winc1 = S.imag-dx*(w-direction*cwidth+wgap+w+cwidth)   
-      #Outer C2
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc2 = S.real+dy*(w+direction*cwidth+wgap+w+cwidth)
-      ycoor_Winc2 = S.imag-dx*(w+direction*cwidth+wgap+w+cwidth)
-      #Inner, C1
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX                 
-      xcoor_Winc3 = S.real-dy*(w-direction*cwidth-wgap-w-cwidth)
-      ycoor_Winc3 = S.imag+dx*(w-direction*cwidth-wgap-w-cwidth)
-      #Inner C2
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX                
-      xcoor_Winc4 = S.real-dy*(w+direction*cwidth-wgap-w-cwidth)
-      ycoor_Winc4 = S.imag+dx*(w+direction*cwidth-wgap-w-cwidth)
-      
-      #wG2
-      #Outer, C1
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX    
-      w2xcoor_Winc1 = S.real+dy*(w2+direction*cwidth2-wgap-w2-cwidth2)
-      w2ycoor_Winc1 = S.imag-dx*(w2+direction*cwidth2-wgap-w2-cwidth2)  
-      #Outer C2
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX                 
-      w2xcoor_Winc2 = S.real+dy*(w2-direction*cwidth2-wgap-w2-cwidth2)
-      w2ycoor_Winc2 = S.imag-dx*(w2-direction*cwidth2-wgap-w2-cwidth2)
-      #Inner, C1
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX                 
-      w2xcoor_Winc3 = S.real-dy*(w2+direction*cwidth2+wgap+w2+cwidth2)
-      w2ycoor_Winc3 = S.imag+dx*(w2+direction*cwidth2+wgap+w2+cwidth2)
-      #Inner C2
-      S = ((r_spiral)*cmath.exp(j*abs(angle)))-deltaX                
-      w2xcoor_Winc4 = S.real-dy*(w2-direction*cwidth2+wgap+w2+cwidth2)
-      w2ycoor_Winc4 = S.imag+dx*(w2-direction*cwidth2+wgap+w2+cwidth2)
-      
-      if cwidth!=0:  
-        yield xcoor_Winc1,ycoor_Winc1,xcoor_Winc2,ycoor_Winc2,xcoor_Winc3,ycoor_Winc3,xcoor_Winc4,ycoor_Winc4,dx,dy,w2xcoor_Winc1,w2ycoor_Winc1,w2xcoor_Winc2,w2ycoor_Winc2,w2xcoor_Winc3,w2ycoor_Winc3,w2xcoor_Winc4,w2ycoor_Winc4
-      else:
-        yield xcoor_Winc1,ycoor_Winc1,xcoor_Winc3,ycoor_Winc3,dx,dy,w2xcoor_Winc1,w2ycoor_Winc1,w2xcoor_Winc3,w2ycoor_Winc3
+          current_total_length += abs(S2-S1)
+        S1 = S2
+
+def angle_table(r, length, grating_length, NoCenter=False):
+    #Angles of the gratings from angle_from_corrugation (or the NoCenter variant) as an array.
+    #They only depend on the spiral and grating lengths, so they are kept in the on-disk cache
+    #and the spirals are not recalculated each time a layout is opened
+    key = (r, gap, alpha, length, grating_length, NoCenter, grating_tolerance)
+    if NoCenter:
+        calculate = lambda: list(angle_from_corrugation_NoCenter(r, length, grating_length))
+    else:
+        calculate = lambda: list(angle_from_corrugation(r, length, grating_length))
+    return cached_array("spiral_angles", key, calculate)
+
+def archimedes_length(c, a, theta):
+    #Arc length of the Archimedean spiral r = c+a*t, from t = 0 to theta
+    def F(r):
+        R = math.sqrt(r*r+a*a)
+        return (r*R+a*a*math.log(r+R))/(2*a)
+    return F(c+a*theta)-F(c)
+
+def spiral_turns(length, wg_width, min_radius, wg_spacing, spiral_ports=0):
+    #Number of turns of the spiral PCell needed to reach the target length, and the resulting waveguide length
+    #Both arms follow r = 2*min_radius+a*t for t = 0 .. 2*pi*turns, and are joined by two half circles of radius
+    #min_radius. The angle at which the target length is reached is found by Newton's method on the arc length,
+    #then rounded up to full turns so that the ports stay on the x axis
+    a = 2*(wg_spacing+wg_width)/(2*pi)
+    c = 2*min_radius
+    center = 2*pi*min_radius #S-shape in the middle
+    turns = 0
+    if length > 0:
+        target = max(length-center, 0)/2 #per arm
+        theta = (math.sqrt(c*c+2*a*target)-c)/a #first guess, from the area of the arm
+        for i in range(50):
+            error = archimedes_length(c, a, theta)-target
+            if abs(error) < 1e-9:
+                break
+            theta -= error/math.sqrt((c+a*theta)**2+a*a)
+        turns = max(1, int(math.ceil(theta/(2*pi)-1e-9)))
+    spiral_length = 2*archimedes_length(c, a, 2*pi*turns)+center
+    if spiral_ports:
+        #extra 1/2 arm
+        spiral_length += archimedes_length(c, a, 2*pi*turns+pi)-archimedes_length(c, a, 2*pi*turns)
+    return turns, spiral_length
+
+def archimedes_arm(a, r_in, r_out, start, span):
+    #Inner and outer edges of one arm of the spiral PCell, (a*t+r_in)*exp(j*t) and (a*t+r_out)*exp(j*t)
+    #for t = start .. start+span, as float64 arrays of points
+    #Both edges have the points_per_circle segments of the outer one, so that their points face each other
+    npoints = int(points_per_circle(r_out))
+    t = start+numpy.arange(npoints+1)*(span/npoints)
+    return as_points((a*t+r_in)*numpy.exp(j*t)), as_points((a*t+r_out)*numpy.exp(j*t))
 
-def finish_CDC(r,finalangle,w,dx,dy,cwidth,wgap,direction):
-    #This finishes the spiral to the 0 or 180 position with a uniform waveguide, also makes it easier to match via pins
-    #The radius of the individual walls, basically draws 2 lines for each wall of the waveguide and appends hte points
-    r_Winc = r+w+direction*(cwidth+wgap+w)
-    r_Wdec = r-w+direction*(cwidth+wgap+w)
-    
-    x_inc=[]
-    y_inc=[]
-    x_dec=[]
-    y_dec=[]
-    
-    deltaX = (r*sign(finalangle))*cmath.exp(-abs(finalangle)/alpha)    
-    r_spiral = ((r)*sign(finalangle))+(gap*finalangle/pi)
-    S = (r_spiral*cmath.exp(j*abs(finalangle)))-deltaX  
-    x_inc.append(S.real+dy*w+dy*direction*(wgap+w+cwidth))
-    y_inc.append(S.imag-dx*w-dx*direction*(wgap+w+cwidth))
-        
-    r_spiral = ((r)*sign(finalangle))+(gap*finalangle/pi)
-    S = (r_spiral*cmath.exp(j*abs(finalangle)))-deltaX  
-    x_dec.append(S.real-dy*w-dy*direction*(-wgap-w-cwidth))
-    y_dec.append(S.imag+dx*w+dx*direction*(-wgap-w-cwidth))
-
-    nextpie = math.ceil(finalangle/ (pi)) * pi        
-    for angle in frange(finalangle+0.01,nextpie,0.01):
-        deltaX = (r*sign(angle))*cmath.exp(-abs(angle)/alpha)
-        
-        r_spiral = (r_Winc*sign(angle))+(gap*angle/pi)
-        S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX  
-        x_inc.append(S.real)
-        y_inc.append(S.imag)
-        
-        r_spiral = (r_Wdec*sign(angle))+(gap*angle/pi)
-        S = (r_spiral*cmath.exp(j*abs(angle)))-deltaX  
-        x_dec.append(S.real)
-        y_dec.append(S.imag)
-        
-    #appends the final coordinate at y=0
-    deltaX = (r*sign(nextpie))*cmath.exp(-abs(nextpie)/alpha)
-    r_spiral = (r_Winc*sign(nextpie))+(gap*nextpie/pi)
-    S = (r_spiral*cmath.exp(j*abs(nextpie)))-deltaX 
-    x_inc.append(S.real)
-    y_inc.append(S.imag)
-    endx1 = S.real
-    
-    deltaX = (r*sign(nextpie))*cmath.exp(-abs(nextpie)/alpha)
-    r_spiral = (r_Wdec*sign(nextpie))+(gap*nextpie/pi)
-    S = (r_spiral*cmath.exp(j*abs(nextpie)))-deltaX 
-    x_dec.append(S.real)
-    y_dec.append(S.imag)
-    endx2 = S.real
-    
-    return x_inc,y_inc,x_dec,y_dec,endx1,endx2
-                
 ###########################
 
 class PCMSpiralBraggGrating(pya.PCellDeclarationHelper):
@@ -463,7 +238,7 @@ class PCMSpiralBraggGrating(pya.PCellDeclarationHelper):
 
     # Important: initialize the super class
     super(PCMSpiralBraggGrating, self).__init__()
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     
     # declare the parameters
     self.param("silayer", self.TypeLayer, "Si Layer", default = TECHNOLOGY['Waveguide'])
@@ -510,121 +285,26 @@ class PCMSpiralBraggGrating(pya.PCellDeclarationHelper):
     grating_length = self.period/2.0*10**-3
      
     #Step1 Find the Angles of each grating#######    
-    angle_array=[]
-    for theta in angle_from_corrugation(r,length,grating_length):
-        angle_array.append(theta)
+    angle_array = angle_table(r,length,grating_length)
     ####################
     
     #####################
     #Step2 Find the Coordinates of the gratings via the angles
-    #Wall1 of the Left    
-    left_x_inc = []
-    left_y_inc = []
-    left_x_dec = []
-    left_y_dec = []
-    #Wall2 of the Left
-    left2_x_inc = []
-    left2_y_inc = []
-    left2_x_dec = []
-    left2_y_dec = []
-    
-    #Calculate the Spiral Coordinates
-    for coord in spiral_gen(r,angle_array,w,cwidth,grating_length):
-        left_x_inc.append(coord[0])
-        left_y_inc.append(coord[1])
-        left_x_dec.append(coord[2])
-        left_y_dec.append(coord[3])
-        
-        left2_x_inc.append(coord[4])
-        left2_y_inc.append(coord[5])
-        left2_x_dec.append(coord[6])
-        left2_y_dec.append(coord[7])
-    dx = coord[8]
-    dy = coord[9]
-    #Flip coords for right side coords
-    right_x_inc = [i*-1 for i in left_x_inc]
-    right_y_inc = [i*-1 for i in left_y_inc]
-    right_x_dec = [i*-1 for i in left_x_dec]
-    right_y_dec = [i*-1 for i in left_y_dec]
-    
-    right2_x_inc = [i*-1 for i in left2_x_inc]
-    right2_y_inc = [i*-1 for i in left2_y_inc]
-    right2_x_dec = [i*-1 for i in left2_x_dec]
-    right2_y_dec = [i*-1 for i in left2_y_dec]
-    #Obtain a sorted list of the coordinates of one wall.
-    #repeat for the rest
-    result = sort_coord(True,left_x_inc,left_y_inc,left_x_dec,left_y_dec)
-    left1x = result[0]
-    left1y = result[1]
-    result = sort_coord(False,left2_x_inc,left2_y_inc,left2_x_dec,left2_y_dec)
-    left2x = result[0]
-    left2y = result[1]
-    
-    result = sort_coord(False,right_x_inc,right_y_inc,right_x_dec,right_y_dec)
-    right1x = result[0]
-    right1y = result[1]
-    
-    #Delete the first two points as they over lap
-    del right1x[0]#calls the same index here because once you remove 0, 1 becomes 0, and so on and so forth
-    del right1x[0]
-    del right1y[0]
-    del right1y[0]
-    
-    result = sort_coord(True,right2_x_inc,right2_y_inc,right2_x_dec,right2_y_dec)
-    right2x = result[0]
-    right2y = result[1]
-    del right2x[0]
-    del right2x[0]
-    del right2y[0]
-    del right2y[0]
-    
-    #UNIFORM SECTION
-    
-    del left1x[-1]
-    del left1y[-1]
-    del left2x[-1]
-    del left2y[-1]
-
-    del right1x[-1]
-    del right1y[-1]
-    del right2x[-1]
-    del right2y[-1]
- 
-    result = finish_spiral(r,angle_array[-2],w,dx,dy)
-    left1x.extend(result[0])
-    left1y.extend(result[1])
-    left2x.extend(result[2])
-    left2y.extend(result[3])
-    
-    right1x.extend(i*-1 for i in result[0])
-    right1y.extend(i*-1 for i in result[1])
-    right2x.extend(i*-1 for i in result[2])
-    right2y.extend(i*-1 for i in result[3])
+    #Walls of the Left, the Right is the same spiral rotated by 180 degrees with the gratings in the other phase
+    left1, left2, dx, dy = spiral_walls(r,angle_array,w,cwidth,grating_length)
+    right1, right2, dx, dy = spiral_walls(r,angle_array,w,cwidth,grating_length,phase=False)
+    
+    #UNIFORM SECTION, the last grating is replaced by the uniform waveguide
+    #and the first two points of the right overlap with the left
+    outer, inner = finish_spiral(r,angle_array[-2],w,dx,dy)
+    left1 = numpy.concatenate((left1[:-1], outer))
+    left2 = numpy.concatenate((left2[:-1], inner))
+    right1 = -numpy.concatenate((right1[2:-1], outer))
+    right2 = -numpy.concatenate((right2[2:-1], inner))
     #########################################
     
-    #Step3 Organize all the points into a single matrix to be drawn in klayout.
-    spiral_x = []
-    spiral_y = []
-    
-    spiral_x.extend(reversed(left1x))
-    spiral_x.extend(right2x)
-    spiral_x.extend(reversed(right1x))
-    spiral_x.extend(left2x)
-    
-    spiral_y.extend(reversed(left1y))
-    spiral_y.extend(right2y)
-    spiral_y.extend(reversed(right1y))
-    spiral_y.extend(left2y)
-    
-    #makes Dpoints from the coordinates
-    dpts=[pya.DPoint(spiral_x[i], spiral_y[i]) for i in range(len(spiral_x))]
-    dpolygon = DPolygon(dpts)    
-    #dmult_pts = mult_pts(dpts,1)
-        
-    #dpoint polygon solution thanks to Jaspreet#
-    element = Polygon.from_dpoly(dpolygon*(1.0/dbu))
-    shapes(LayerSiN).insert(element)
-    #shapes(LayerSiN).insert(Polygon.from_dpoly(dpolygon))      
+    #Step3 Organize all the points into the two walls of the spiral to be drawn in klayout.
+    spiral_ribbon(shapes(LayerSiN), numpy.concatenate((left1[::-1], right2)), numpy.concatenate((left2[::-1], right1)))
     
     # Create the pins, as short paths:
     DeviceHeight = self.cell.bbox().height()
@@ -666,7 +346,7 @@ class PCMSpiralBraggGratingSlab(pya.PCellDeclarationHelper):
 
     # Important: initialize the super class
     super(PCMSpiralBraggGratingSlab, self).__init__()
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
 
     # declare the parameters
     self.param("silayer", self.TypeLayer, "Si Layer", default = TECHNOLOGY['Waveguide'])
@@ -708,206 +388,45 @@ class PCMSpiralBraggGratingSlab(pya.PCellDeclarationHelper):
     sw = self.sw*10**-3/2.0
      
     #Step1 Find the Angles of each grating#######    
-    angle_array=[]
-    for theta in angle_from_corrugation(r,length,grating_length):
-        angle_array.append(theta)
+    angle_array = angle_table(r,length,grating_length)
     ####################
     
     #####################
     #Step2 Find the Coordinates of the gratings via the angles
-    #Wall1 of the Left    
-    left_x_inc = []
-    left_y_inc = []
-    left_x_dec = []
-    left_y_dec = []
-    #Wall2 of the Left
-    left2_x_inc = []
-    left2_y_inc = []
-    left2_x_dec = []
-    left2_y_dec = []
-    
-    #Calculate the Spiral Coordinates
-    for coord in spiral_gen(r,angle_array,w,cwidth,grating_length):
-        left_x_inc.append(coord[0])
-        left_y_inc.append(coord[1])
-        left_x_dec.append(coord[2])
-        left_y_dec.append(coord[3])
-        
-        left2_x_inc.append(coord[4])
-        left2_y_inc.append(coord[5])
-        left2_x_dec.append(coord[6])
-        left2_y_dec.append(coord[7])
-    dx = coord[8]
-    dy = coord[9]
-    #Flip coords for right side coords
-    right_x_inc = [i*-1 for i in left_x_inc]
-    right_y_inc = [i*-1 for i in left_y_inc]
-    right_x_dec = [i*-1 for i in left_x_dec]
-    right_y_dec = [i*-1 for i in left_y_dec]
-    
-    right2_x_inc = [i*-1 for i in left2_x_inc]
-    right2_y_inc = [i*-1 for i in left2_y_inc]
-    right2_x_dec = [i*-1 for i in left2_x_dec]
-    right2_y_dec = [i*-1 for i in left2_y_dec]
-    #Obtain a sorted list of the coordinates of one wall.
-    #repeat for the rest
-    result = sort_coord(True,left_x_inc,left_y_inc,left_x_dec,left_y_dec)
-    left1x = result[0]
-    left1y = result[1]
-    result = sort_coord(False,left2_x_inc,left2_y_inc,left2_x_dec,left2_y_dec)
-    left2x = result[0]
-    left2y = result[1]
-    
-    result = sort_coord(False,right_x_inc,right_y_inc,right_x_dec,right_y_dec)
-    right1x = result[0]
-    right1y = result[1]
-    #Delete the first two points as they over lap
-    del right1x[0]#calls the same index here because once you remove 0, 1 becomes 0, and so on and so forth
-    del right1x[0]
-    del right1y[0]
-    del right1y[0]
-    
-    result = sort_coord(True,right2_x_inc,right2_y_inc,right2_x_dec,right2_y_dec)
-    right2x = result[0]
-    right2y = result[1]
-    del right2x[0]
-    del right2x[0]
-    del right2y[0]
-    del right2y[0]
-    
-    #UNIFORM SECTION
-    
-    del left1x[-1]
-    del left1y[-1]
-    del left2x[-1]
-    del left2y[-1]
-
-    del right1x[-1]
-    del right1y[-1]
-    del right2x[-1]
-    del right2y[-1]
- 
-    result = finish_spiral(r,angle_array[-2],w,dx,dy)
-    left1x.extend(result[0])
-    left1y.extend(result[1])
-    left2x.extend(result[2])
-    left2y.extend(result[3])
-    
-    right1x.extend(i*-1 for i in result[0])
-    right1y.extend(i*-1 for i in result[1])
-    right2x.extend(i*-1 for i in result[2])
-    right2y.extend(i*-1 for i in result[3])
+    #Walls of the Left, the Right is the same spiral rotated by 180 degrees with the gratings in the other phase
+    left1, left2, dx, dy = spiral_walls(r,angle_array,w,cwidth,grating_length)
+    right1, right2, dx, dy = spiral_walls(r,angle_array,w,cwidth,grating_length,phase=False)
+    
+    #UNIFORM SECTION, the last grating is replaced by the uniform waveguide
+    #and the first two points of the right overlap with the left
+    outer, inner = finish_spiral(r,angle_array[-2],w,dx,dy)
+    left1 = numpy.concatenate((left1[:-1], outer))
+    left2 = numpy.concatenate((left2[:-1], inner))
+    right1 = -numpy.concatenate((right1[2:-1], outer))
+    right2 = -numpy.concatenate((right2[2:-1], inner))
     #########################################
     
-    #Step3 Organize all the points into a single matrix to be drawn in klayout.
-    spiral_x = []
-    spiral_y = []
-    
-    spiral_x.extend(reversed(left1x))
-    spiral_x.extend(right2x)
-    spiral_x.extend(reversed(right1x))
-    spiral_x.extend(left2x)
+    #Step3 Organize all the points into the two walls of the spiral to be drawn in klayout.
+    spiral_ribbon(shapes(LayerSiN), numpy.concatenate((left1[::-1], right2)), numpy.concatenate((left2[::-1], right1)))
     
-    spiral_y.extend(reversed(left1y))
-    spiral_y.extend(right2y)
-    spiral_y.extend(reversed(right1y))
-    spiral_y.extend(left2y)
-    
-    #makes Dpoints from the coordinates
-    dpts=[pya.DPoint(spiral_x[i], spiral_y[i]) for i in range(len(spiral_x))]
-    dpolygon = DPolygon(dpts)    
-    #dmult_pts = mult_pts(dpts,1)
-        
-    #dpoint polygon solution thanks to Jaspreet#
-    element = Polygon.from_dpoly(dpolygon*(1.0/dbu))
-    shapes(LayerSiN).insert(element)
-    
-    #Step4 Draw slab spiral
-    #Step2 Find the Coordinates of the gratings via the angles
-    #Wall1 of the Left    
-    left_xS = []
-    left_yS = []
-    #Wall2 of the Left
-    left2_xS = []
-    left2_yS = []
-    
-    #Calculate the Spiral Coordinates
-    for coord in spiral_gen(r,angle_array,sw,0,grating_length):
-    #for coord in spiral_gen_legacy(r,angle_array,sw):
-        left_xS.append(coord[0])
-        left_yS.append(coord[1])
-        left2_xS.append(coord[2])
-        left2_yS.append(coord[3])
-    dx = coord[4]
-    dy = coord[5]
-    #Flip coords for right side coords
-    right_xS = [i*-1 for i in left_xS]
-    right_yS = [i*-1 for i in left_yS]    
-    right2_xS = [i*-1 for i in left2_xS]
-    right2_yS = [i*-1 for i in left2_yS]
-    #Obtain a sorted list of the coordinates of one wall.
-    
-    #Delete the first two points as they over lap
-    del right_xS[0]#calls the same index here because once you remove 0, 1 becomes 0, and so on and so forth
-    del right_xS[0]
-    del right_yS[0]
-    del right_yS[0]
-    
-    del right2_xS[0]
-    del right2_xS[0]
-    del right2_yS[0]
-    del right2_yS[0]
-    
-    #UNIFORM SECTION
-    del left_xS[-1]
-    del left_yS[-1]
-    del left2_xS[-1]
-    del left2_yS[-1]
-    
-    del right_xS[-1]
-    del right_yS[-1]
-    del right2_xS[-1]
-    del right2_yS[-1]
-     
-    result = finish_spiral(r,angle_array[-1],sw,dx,dy)
-    left_xS.extend(result[0])
-    left_yS.extend(result[1])
-    left2_xS.extend(result[2])
-    left2_yS.extend(result[3])
-    
-    right_xS.extend(i*-1 for i in result[0])
-    right_yS.extend(i*-1 for i in result[1])
-    right2_xS.extend(i*-1 for i in result[2])
-    right2_yS.extend(i*-1 for i in result[3])
+    #Step4 Draw slab spiral, without gratings
+    left, left2, dx, dy = spiral_walls(r,angle_array,sw,0,grating_length)
+    outer, inner = finish_spiral(r,angle_array[-1],sw,dx,dy)
+    right = -numpy.concatenate((left[2:-1], outer))
+    right2 = -numpy.concatenate((left2[2:-1], inner))
+    left = numpy.concatenate((left[:-1], outer))
+    left2 = numpy.concatenate((left2[:-1], inner))
     #########################################
     
-    #Step4.5 Organize all the points into a single matrix to be drawn in klayout.
-    slab_x = []
-    slab_y = []
-    
-    slab_x.extend(reversed(left_xS))
-    slab_x.extend(right2_xS)
-    slab_x.extend(reversed(right_xS))
-    slab_x.extend(left2_xS)
-    
-    slab_y.extend(reversed(left_yS))
-    slab_y.extend(right2_yS)
-    slab_y.extend(reversed(right_yS))
-    slab_y.extend(left2_yS)
-    
-    #makes Dpoints from the coordinates
-    dptsS=[pya.DPoint(slab_x[i], slab_y[i]) for i in range(len(slab_x))]
-    dpolygonS = DPolygon(dptsS)    
-    #dmult_pts = mult_pts(dpts,1)
+    #Step4.5 Organize all the points into the two walls of the slab to be drawn in klayout.
+    slab_edges = (numpy.concatenate((left[::-1], right2)), numpy.concatenate((left2[::-1], right)))
         
 
     #Step6 Pins!    
     DeviceWidthNS = self.cell.bbox().width() #width of device without slab included yet, for drawing WG
     
     #insert slab
-    #dpoint polygon solution thanks to Jaspreet#
-    elementS = Polygon.from_dpoly(dpolygonS*(1.0/dbu))
-    shapes(LayerSiN_Slab).insert(elementS)
+    spiral_ribbon(shapes(LayerSiN_Slab), *slab_edges)
     #Slab Tapers
     dpts=[pya.DPoint(-(self.cell.bbox().width()/2.0*dbu), 0),pya.DPoint(-(self.cell.bbox().width()/2.0)*dbu+sw*2.0, 0),pya.DPoint(-(self.cell.bbox().width()/2.0)*dbu+(sw-w)+w*2.0, -10),pya.DPoint(-(self.cell.bbox().width()/2.0)*dbu+(sw-w), -10)]
     dpolygon = DPolygon(dpts)
@@ -955,7 +474,7 @@ class Spiral_NoCenterBraggGrating(pya.PCellDeclarationHelper):
 
     # Important: initialize the super class
     super(Spiral_NoCenterBraggGrating, self).__init__()
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
 
     # declare the parameters
     self.param("silayer", self.TypeLayer, "Si Layer", default = TECHNOLOGY['Waveguide'])
@@ -994,148 +513,39 @@ class Spiral_NoCenterBraggGrating(pya.PCellDeclarationHelper):
     grating_length = self.period/2.0*10**-3
      
     #Step1 Find the Angles of each grating#######    
-    angle_array=[]
-    for theta in angle_from_corrugation(r,length,grating_length):
-        angle_array.append(theta)
+    angle_array = angle_table(r,length,grating_length)
     
     #IF WANT TO CALCULATE BASED ON LENGTH OF WG that includes gratings
     '''    
-    angle_array_NoCenter=[]
-    for theta in angle_from_corrugation_NoCenter(r,length,grating_length):
-        angle_array_NoCenter.append(theta)
+    angle_array_NoCenter = angle_table(r,length,grating_length,NoCenter=True)
     '''
     ####################
     
     #####################
     #Step2 Find the Coordinates of the gratings via the angles
-    #Wall1 of the Left    
-    left_x_inc = []
-    left_y_inc = []
-    left_x_dec = []
-    left_y_dec = []
-    #Wall2 of the Left
-    left2_x_inc = []
-    left2_y_inc = []
-    left2_x_dec = []
-    left2_y_dec = []
-    
-    
-    nongrating = spiral_gen_NoCenter(r,angle_array,w,cwidth,grating_length)
-    left1c_x = nongrating[0]
-    left1c_y = nongrating[1]
-    left2c_x = nongrating[2]
-    left2c_y = nongrating[3]
-    lasti = nongrating[4]
-    right1c_x = [i*-1 for i in left1c_x]
-    right1c_y = [i*-1 for i in left1c_y]
-    right2c_x = [i*-1 for i in left2c_x]
-    right2c_y = [i*-1 for i in left2c_y]
+    #Center, a uniform waveguide up to the first grating past 180 degrees
+    lasti = int(numpy.argmax(numpy.asarray(angle_array) >= pi))
+    left1c, left2c, dx, dy = spiral_walls(r,angle_array[:lasti+2],w,0,grating_length)
     
-    #Calculate the Spiral Coordinates
+    #Calculate the Spiral Coordinates, the gratings are only on the Left
     #IF WANT TO CALCULATE BASED ON LENGTH OF WG that includes gratings
-    #for coord in spiral_gen_NoCenter_Gratings(r,angle_array_NoCenter,w,cwidth,grating_length,lasti-1):
-    for coord in spiral_gen_NoCenter_Gratings(r,angle_array,w,cwidth,grating_length,lasti-1):
-        left_x_inc.append(coord[0])
-        left_y_inc.append(coord[1])
-        left_x_dec.append(coord[2])
-        left_y_dec.append(coord[3])
-        
-        left2_x_inc.append(coord[4])
-        left2_y_inc.append(coord[5])
-        left2_x_dec.append(coord[6])
-        left2_y_dec.append(coord[7])
-    
-    dx = coord[8]
-    dy = coord[9]
-    
-    right1x =[]
-    right1y =[]
-    right2x =[]
-    right2y =[]
-    for coord in spiral_gen_NoCenter_Gratings(r,angle_array,w,0,grating_length,lasti-1):
-      right1x.append(coord[0])
-      right1y.append(coord[1])
-      right2x.append(coord[2])
-      right2y.append(coord[3])
-
-    #Flip coords for right side coords
-    right1x = [i*-1 for i in right1x]
-    right1y = [i*-1 for i in right1y]
-    right2x = [i*-1 for i in right2x]
-    right2y = [i*-1 for i in right2y]
-
-    #Obtain a sorted list of the coordinates of one wall.
-    #repeat for the rest
-    result = sort_coord(True,left_x_inc,left_y_inc,left_x_dec,left_y_dec)
-    left1x = result[0]
-    left1y = result[1]
-    result = sort_coord(False,left2_x_inc,left2_y_inc,left2_x_dec,left2_y_dec)
-    left2x = result[0]
-    left2y = result[1]
-
-    #Center Boundary Point
-    del left1x[0]
-    del left1y[0]
-    del left2x[0]
-    del left2y[0]
-    
-    #UNIFORM SECTION
-    
-    del left1x[-1]
-    del left1y[-1]
-    del left2x[-1]
-    del left2y[-1]
-
-    del right1x[-1]
-    del right1y[-1]
-    del right2x[-1]
-    del right2y[-1]
- 
-    result = finish_spiral(r,angle_array[-2],w,dx,dy)
+    #left1, left2, dx, dy = spiral_walls(r,angle_array_NoCenter,w,cwidth,grating_length,lasti)
+    right1, right2, dx, dy = spiral_walls(r,angle_array,w,0,grating_length,lasti)
+    left1, left2, dx, dy = spiral_walls(r,angle_array,w,cwidth,grating_length,lasti)
+    
+    #Center Boundary Point, and UNIFORM SECTION
+    outer, inner = finish_spiral(r,angle_array[-2],w,dx,dy)
     #IF WANT TO CALCULATE BASED ON LENGTH OF WG that includes gratings
-    #result = finish_spiral(r,angle_array_NoCenter[-2],w,dx,dy)
-    left1x.extend(result[0])
-    left1y.extend(result[1])
-    left2x.extend(result[2])
-    left2y.extend(result[3])
-    
-    right1x.extend(i*-1 for i in result[0])
-    right1y.extend(i*-1 for i in result[1])
-    right2x.extend(i*-1 for i in result[2])
-    right2y.extend(i*-1 for i in result[3])
+    #outer, inner = finish_spiral(r,angle_array_NoCenter[-2],w,dx,dy)
+    left1 = numpy.concatenate((left1[1:-1], outer))
+    left2 = numpy.concatenate((left2[1:-1], inner))
+    right1 = -numpy.concatenate((right1[:-1], outer))
+    right2 = -numpy.concatenate((right2[:-1], inner))
     #########################################
     
-    #Step3 Organize all the points into a single matrix to be drawn in klayout.
-    spiral_x = []
-    spiral_y = []
-    
-    spiral_x.extend(reversed(left1x))
-    spiral_x.extend(reversed(left1c_x))
-    spiral_x.extend(right2c_x)
-    spiral_x.extend(right2x)
-    spiral_x.extend(reversed(right1x))
-    spiral_x.extend(reversed(right1c_x))
-    spiral_x.extend(left2c_x)
-    spiral_x.extend(left2x)
-    
-    spiral_y.extend(reversed(left1y))
-    spiral_y.extend(reversed(left1c_y))
-    spiral_y.extend(right2c_y)
-    spiral_y.extend(right2y)
-    spiral_y.extend(reversed(right1y))
-    spiral_y.extend(reversed(right1c_y))
-    spiral_y.extend(left2c_y)
-    spiral_y.extend(left2y)
-    
-    #makes Dpoints from the coordinates
-    dpts=[pya.DPoint(spiral_x[i], spiral_y[i]) for i in range(len(spiral_x))]
-    dpolygon = DPolygon(dpts)    
-    #dmult_pts = mult_pts(dpts,1)
-        
-    #dpoint polygon solution thanks to Jaspreet#
-    element = Polygon.from_dpoly(dpolygon*(1.0/dbu))
-    shapes(LayerSiN).insert(element)
-    #shapes(LayerSiN).insert(Polygon.from_dpoly(dpolygon))      
+    #Step3 Organize all the points into the two walls of the spiral to be drawn in klayout.
+    spiral_ribbon(shapes(LayerSiN), numpy.concatenate((left1[::-1], left1c[::-1], -left2c, right2)),
+                  numpy.concatenate((left2[::-1], left2c[::-1], -left1c, right1)))
     
     DeviceHeight = self.cell.bbox().height()*dbu
     #WG1  
@@ -1193,7 +603,7 @@ class CDCSpiralBraggGrating(pya.PCellDeclarationHelper):
 
     # Important: initialize the super class
     super(CDCSpiralBraggGrating, self).__init__()
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     
     # declare the parameters
     self.param("silayer", self.TypeLayer, "Si Layer", default = TECHNOLOGY['Waveguide'])
@@ -1240,252 +650,57 @@ class CDCSpiralBraggGrating(pya.PCellDeclarationHelper):
     wgap = self.wgap/2.0*10**-3
      
     #Step1 Find the Angles of each grating#######    
-    angle_array=[]
-    for theta in angle_from_corrugation(r,length,grating_length):
-        angle_array.append(theta)
+    angle_array = angle_table(r,length,grating_length)
     ####################
     
     #####################
     #Step2 Find the Coordinates of the gratings via the angles
-    #TopHalf WG1
-    #Wall 1    
-    TopW11_x_inc = []
-    TopW11_y_inc = []
-    TopW11_x_dec = []
-    TopW11_y_dec = []
-    #Wall 2
-    TopW12_x_inc = []
-    TopW12_y_inc = []
-    TopW12_x_dec = []
-    TopW12_y_dec = []
-    
-    #Top half WG2
-    #Wall 1
-    TopW21_x_inc = []
-    TopW21_y_inc = []
-    TopW21_x_dec = []
-    TopW21_y_dec = []
-    #Wall 2
-    TopW22_x_inc = []
-    TopW22_y_inc = []
-    TopW22_x_dec = []
-    TopW22_y_dec = []
-    
-    #Bottom Half
-    #Wall 1    
-    BotW11_x_inc = []
-    BotW11_y_inc = []
-    BotW11_x_dec = []
-    BotW11_y_dec = []
-    #Wall 2
-    BotW12_x_inc = []
-    BotW12_y_inc = []
-    BotW12_x_dec = []
-    BotW12_y_dec = []
-    
-    #WG2
-    #Wall 1
-    BotW21_x_inc = []
-    BotW21_y_inc = []
-    BotW21_x_dec = []
-    BotW21_y_dec = []
-    #Wall 2
-    BotW22_x_inc = []
-    BotW22_y_inc = []
-    BotW22_x_dec = []
-    BotW22_y_dec = []
-    
-    #Calculate the Spiral Coordinates
-    for coord in CDC_gen(r,angle_array,w,w2,cwidth,cwidth2,grating_length,wgap,1):
-        TopW11_x_inc.append(coord[0])
-        TopW11_y_inc.append(coord[1])
-        TopW11_x_dec.append(coord[2])
-        TopW11_y_dec.append(coord[3])        
-        TopW12_x_inc.append(coord[4])
-        TopW12_y_inc.append(coord[5])
-        TopW12_x_dec.append(coord[6])
-        TopW12_y_dec.append(coord[7])
-        TopW21_x_inc.append(coord[10])
-        TopW21_y_inc.append(coord[11])
-        TopW21_x_dec.append(coord[12])
-        TopW21_y_dec.append(coord[13])
-        TopW22_x_inc.append(coord[14])
-        TopW22_y_inc.append(coord[15])
-        TopW22_x_dec.append(coord[16])
-        TopW22_y_dec.append(coord[17])
-    dx = coord[8] #Used for calculaing the no-grating portion
-    dy = coord[9]
-    
-    for coord in CDC_gen(r,angle_array,w2,w,cwidth2,cwidth,grating_length,wgap,1):
-        BotW21_x_inc.append(-coord[0])
-        BotW21_y_inc.append(-coord[1])
-        BotW21_x_dec.append(-coord[2])
-        BotW21_y_dec.append(-coord[3])        
-        BotW22_x_inc.append(-coord[4])
-        BotW22_y_inc.append(-coord[5])
-        BotW22_x_dec.append(-coord[6])
-        BotW22_y_dec.append(-coord[7])
-        BotW11_x_inc.append(-coord[10])
-        BotW11_y_inc.append(-coord[11])
-        BotW11_x_dec.append(-coord[12])
-        BotW11_y_dec.append(-coord[13])
-        BotW12_x_inc.append(-coord[14])
-        BotW12_y_inc.append(-coord[15])
-        BotW12_x_dec.append(-coord[16])
-        BotW12_y_dec.append(-coord[17])
-
-    #Obtain a sorted list of the coordinates of one wall.
-    #repeat for the rest
-    #WG1
-    result = sort_coord(True,TopW11_x_inc,TopW11_y_inc,TopW11_x_dec,TopW11_y_dec)
-    TW11x = result[0]
-    TW11y = result[1]
-    #del TW11x[0]
-    #del TW11y[0]
-    
-    result = sort_coord(False,TopW12_x_inc,TopW12_y_inc,TopW12_x_dec,TopW12_y_dec)
-    TW12x = result[0]
-    TW12y = result[1]    
-    
-    result = sort_coord(False,BotW11_x_inc,BotW11_y_inc,BotW11_x_dec,BotW11_y_dec)
-    BW11x = result[0]
-    BW11y = result[1]
-    #Delete the first two points as they over lap
-    del BW11x[0]#calls the same index here because once you remove 0, 1 becomes 0, and so on and so forth
-    del BW11x[0]
-    del BW11y[0]
-    del BW11y[0]
-        
-    result = sort_coord(True,BotW12_x_inc,BotW12_y_inc,BotW12_x_dec,BotW12_y_dec)
-    BW12x = result[0]
-    BW12y = result[1]
-    del BW12x[0]
-    del BW12x[0]
-    del BW12y[0]
-    del BW12y[0]  
-  
-       
-    #Delete for Uniform connection    
-    del TW11x[-1]
-    del TW11y[-1]
-    del TW12x[-1]
-    del TW12y[-1]
-    del BW11x[-1]
-    del BW11y[-1]
-    del BW12x[-1]
-    del BW12y[-1]
-    
-    #WG2   
-    result = sort_coord(True,TopW21_x_inc,TopW21_y_inc,TopW21_x_dec,TopW21_y_dec)
-    TW21x = result[0]
-    TW21y = result[1]
-    
-    result = sort_coord(False,TopW22_x_inc,TopW22_y_inc,TopW22_x_dec,TopW22_y_dec)
-    TW22x = result[0]
-    TW22y = result[1]    
-    
-    result = sort_coord(False,BotW21_x_inc,BotW21_y_inc,BotW21_x_dec,BotW21_y_dec)
-    BW21x = result[0]
-    BW21y = result[1]
-    
-    #Delete the first two points as they over lap
-    del BW21x[0]#calls the same index here because once you remove 0, 1 becomes 0, and so on and so forth
-    del BW21x[0]
-    del BW21y[0]
-    del BW21y[0]    
-    result = sort_coord(True,BotW22_x_inc,BotW22_y_inc,BotW22_x_dec,BotW22_y_dec)
-    BW22x = result[0]
-    BW22y = result[1]
-    del BW22x[0]
-    del BW22x[0]
-    del BW22y[0]
-    del BW22y[0]    
-
-    #UNIFORM SECTION    
-    del TW21x[-1]
-    del TW21y[-1]
-    del TW22x[-1]
-    del TW22y[-1]
-    del BW21x[-1]
-    del BW21y[-1]
-    del BW22x[-1]
-    del BW22y[-1]
-
-    
-    #UNIFORM Endings
+    #Top half, and Bottom half which is the same spiral rotated by 180 degrees with the gratings in the other phase
+    #and the roles of the waveguides swapped
+    BW21, BW22, BW11, BW12, dx, dy = CDC_walls(r,angle_array,w2,w,cwidth2,cwidth,grating_length,wgap,1,phase=False)
+    TW11, TW12, TW21, TW22, dx, dy = CDC_walls(r,angle_array,w,w2,cwidth,cwidth2,grating_length,wgap,1)
+
+    #UNIFORM Endings, the last grating is replaced by the uniform waveguide
+    #and the first two points of the bottom half overlap with the top half
     #WG1
-    result = finish_CDC(r,angle_array[-2],w,dx,dy,cwidth,wgap,1)
-    TW11x.extend(result[0])
-    TW11y.extend(result[1])
-    TW12x.extend(result[2])
-    TW12y.extend(result[3])
-    wg1x1 = result[4] #x coord for drawing wgs later
-    wg1x2 = result[5]
-    result = finish_CDC(r,angle_array[-2],w,dx,dy,cwidth,wgap,-1)
-    BW11x.extend(i*-1 for i in result[0])
-    BW11y.extend(i*-1 for i in result[1])
-    BW12x.extend(i*-1 for i in result[2])
-    BW12y.extend(i*-1 for i in result[3])
-    wg3x1 = -result[4]
-    wg3x2 = -result[5]
+    outer, inner = finish_spiral(r,angle_array[-2],w,dx,dy,wgap+w+cwidth)
+    TW11 = numpy.concatenate((TW11[:-1], outer))
+    TW12 = numpy.concatenate((TW12[:-1], inner))
+    wg1x1 = outer[-1,0] #x coord for drawing wgs later
+    wg1x2 = inner[-1,0]
+    outer, inner = finish_spiral(r,angle_array[-2],w,dx,dy,-(wgap+w+cwidth))
+    BW11 = -numpy.concatenate((BW11[2:-1], outer))
+    BW12 = -numpy.concatenate((BW12[2:-1], inner))
+    wg3x1 = BW11[-1,0]
+    wg3x2 = BW12[-1,0]
     #WG2
-    result = finish_CDC(r,angle_array[-2],w2,dx,dy,cwidth,wgap,-1)
-    TW21x.extend(result[0])
-    TW21y.extend(result[1])
-    TW22x.extend(result[2])
-    TW22y.extend(result[3])
-    wg2x1 = result[4]
-    wg2x2 = result[5]
-    result = finish_CDC(r,angle_array[-2],w2,dx,dy,cwidth,wgap,1)
-    BW21x.extend(i*-1 for i in result[0])
-    BW21y.extend(i*-1 for i in result[1])
-    BW22x.extend(i*-1 for i in result[2])
-    BW22y.extend(i*-1 for i in result[3])
-    wg4x1 = -result[4]
-    wg4x2 = -result[5]
-    
-    #Step3 Organize all the points into a single matrix to be drawn in klayout.
-    spiral1_x = []
-    spiral1_y = []    
-    spiral1_x.extend(reversed(TW11x))
-    spiral1_x.extend(BW12x)
-    spiral1_x.extend(reversed(BW11x))
-    spiral1_x.extend(TW12x)    
-    spiral1_y.extend(reversed(TW11y))
-    spiral1_y.extend(BW12y)
-    spiral1_y.extend(reversed(BW11y))
-    spiral1_y.extend(TW12y) 
-    spiral2_x = []
-    spiral2_y = []
-    spiral2_x.extend(reversed(TW21x))
-    spiral2_x.extend(BW22x)
-    spiral2_x.extend(reversed(BW21x))
-    spiral2_x.extend(TW22x)
-    spiral2_y.extend(reversed(TW21y))
-    spiral2_y.extend(BW22y)
-    spiral2_y.extend(reversed(BW21y))
-    spiral2_y.extend(TW22y)
-    
-    if spiral1_y[-2] <0:#for drawing wgs laters, condition is to determine is the waveguide points up or down(since not symmetrical)
-      devicetop = max(max(spiral1_y),max(spiral2_y))
-      devicebot = min(min(spiral1_y),min(spiral2_y))
+    outer, inner = finish_spiral(r,angle_array[-2],w2,dx,dy,-(wgap+w2+cwidth))
+    TW21 = numpy.concatenate((TW21[:-1], outer))
+    TW22 = numpy.concatenate((TW22[:-1], inner))
+    wg2x1 = outer[-1,0]
+    wg2x2 = inner[-1,0]
+    outer, inner = finish_spiral(r,angle_array[-2],w2,dx,dy,wgap+w2+cwidth)
+    BW21 = -numpy.concatenate((BW21[2:-1], outer))
+    BW22 = -numpy.concatenate((BW22[2:-1], inner))
+    wg4x1 = BW21[-1,0]
+    wg4x2 = BW22[-1,0]
+    
+    #Step3 Organize all the points into the two walls of each waveguide to be drawn in klayout.
+    spiral1 = (numpy.concatenate((TW11[::-1], BW12)), numpy.concatenate((TW12[::-1], BW11)))
+    spiral2 = (numpy.concatenate((TW21[::-1], BW22)), numpy.concatenate((TW22[::-1], BW21)))
+    spiral_y = numpy.concatenate(spiral1 + spiral2)[:,1]
+    
+    if TW12[-2,1] <0:#for drawing wgs laters, condition is to determine is the waveguide points up or down(since not symmetrical)
+      devicetop = spiral_y.max()
+      devicebot = spiral_y.min()
       pin_direction = 1 #pins have to extend out from wg, if the wg switches direction, the pins have to switch signs
     else:
-      devicebot = max(max(spiral1_y),max(spiral2_y))
-      devicetop = min(min(spiral1_y),min(spiral2_y))
+      devicebot = spiral_y.max()
+      devicetop = spiral_y.min()
       pin_direction =-1
     
-    #makes Dpoints from the coordinates
-    dpts=[pya.DPoint(spiral1_x[i], spiral1_y[i]) for i in range(len(spiral1_x))]
-    dpolygon1 = DPolygon(dpts)    
-    dpts=[pya.DPoint(spiral2_x[i], spiral2_y[i]) for i in range(len(spiral2_x))]
-    dpolygon2 = DPolygon(dpts)    
-        
-    #dpoint polygon solution thanks to Jaspreet#
-    element = Polygon.from_dpoly(dpolygon1*(1.0/dbu))
-    shapes(LayerSiN).insert(element)
-    element = Polygon.from_dpoly(dpolygon2*(1.0/dbu))
-    shapes(LayerSiN).insert(element)
+    spiral_ribbon(shapes(LayerSiN), *spiral1)
+    spiral_ribbon(shapes(LayerSiN), *spiral2)
     
     
     # Create the pins, as short paths:    
@@ -1546,7 +761,7 @@ class SpiralWaveguide(pya.PCellDeclarationHelper):
 
     # Important: initialize the super class
     super(SpiralWaveguide, self).__init__()
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     
     # declare the parameters
     self.param("silayer", self.TypeLayer, "Si Layer", default = TECHNOLOGY['Waveguide'])
@@ -1582,74 +797,25 @@ class SpiralWaveguide(pya.PCellDeclarationHelper):
     cwidth = 80*10**-3/2.0 #same reason as width
     grating_length = 1000/2.0*10**-3
     #Step1 Find the Angles of each grating#######    
-    angle_array=[]
-    for theta in angle_from_corrugation(r,length,grating_length):
-        angle_array.append(theta)
+    angle_array = angle_table(r,length,grating_length)
     ####################
 
     
     #Step4 Draw slab spiral
-    #Step2 Find the Coordinates of the gratings via the angles
-    #Wall1 of the Left    
-    left_xS = []
-    left_yS = []
-    #Wall2 of the Left
-    left2_xS = []
-    left2_yS = []
-    
     #Calculate the Spiral Coordinates
-    for coord in spiral_gen(r,angle_array,w,0,grating_length):
-    #for coord in spiral_gen_legacy(r,angle_array,sw):
-        left_xS.append(coord[0])
-        left_yS.append(coord[1])
-        left2_xS.append(coord[2])
-        left2_yS.append(coord[3])
-    dx = coord[4]
-    dy = coord[5]
-    #Flip coords for right side coords
-    right_xS = [i*-1 for i in left_xS]
-    right_yS = [i*-1 for i in left_yS]    
-    right2_xS = [i*-1 for i in left2_xS]
-    right2_yS = [i*-1 for i in left2_yS]
-    #Obtain a sorted list of the coordinates of one wall.
-     
-    result = finish_spiral(r,angle_array[-1],w,dx,dy)
-    left_xS.extend(result[0])
-    left_yS.extend(result[1])
-    left2_xS.extend(result[2])
-    left2_yS.extend(result[3])
-    
-    right_xS.extend(i*-1 for i in result[0])
-    right_yS.extend(i*-1 for i in result[1])
-    right2_xS.extend(i*-1 for i in result[2])
-    right2_yS.extend(i*-1 for i in result[3])
+    left, left2, dx, dy = spiral_walls(r,angle_array,w,0,grating_length)
+    outer, inner = finish_spiral(r,angle_array[-1],w,dx,dy)
+    left = numpy.concatenate((left, outer))
+    left2 = numpy.concatenate((left2, inner))
     #########################################
     
-    #Step4.5 Organize all the points into a single matrix to be drawn in klayout.
-    slab_x = []
-    slab_y = []
-    
-    slab_x.extend(reversed(left_xS))
-    slab_x.extend(right2_xS)
-    slab_x.extend(reversed(right_xS))
-    slab_x.extend(left2_xS)
-    
-    slab_y.extend(reversed(left_yS))
-    slab_y.extend(right2_yS)
-    slab_y.extend(reversed(right_yS))
-    slab_y.extend(left2_yS)
-    
-    #makes Dpoints from the coordinates
-    dptsS=[pya.DPoint(slab_x[i], slab_y[i]) for i in range(len(slab_x))]
-    dpolygonS = DPolygon(dptsS)    
-    #dmult_pts = mult_pts(dpts,1)
+    #Step4.5 Organize all the points into the two walls to be drawn in klayout, the Right is the Left rotated by 180 degrees
+    slab_edges = (numpy.concatenate((left[::-1], -left2)), numpy.concatenate((left2[::-1], -left)))
         
 
     #Step6 Pins!      
     #insert slab
-    #dpoint polygon solution thanks to Jaspreet#
-    elementS = Polygon.from_dpoly(dpolygonS*(1.0/dbu))
-    shapes(LayerSiN_Slab).insert(elementS)
+    spiral_ribbon(shapes(LayerSiN_Slab), *slab_edges)
 
     DeviceHeight = self.cell.bbox().height()*dbu
     DeviceWidthNS = self.cell.bbox().width() #width of device without slab included yet, for drawing WG
@@ -1695,7 +861,7 @@ class spiral(PCellDeclarationHelper):
 
     # Important: initialize the super class
     super(spiral, self).__init__()
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
 
     # declare the parameters
     self.param("length", self.TypeDouble, "Target Waveguide length", default = 10.0)     
@@ -1742,104 +908,27 @@ class spiral(PCellDeclarationHelper):
     a = 2*spacing/(2*pi)
 
 
-    # area, length, turn tracking for spiral
-    area = 0
-    spiral_length = 0
-    turn = -1
+    # number of turns, and length of the spiral
+    turns, spiral_length = spiral_turns(self.length, self.wg_width, self.min_radius, self.wg_spacing, self.spiral_ports)
 
-    from SiEPIC.utils import points_per_circle, arc_wg_xy
+    from SiEPIC.utils import arc_wg_xy
 
-    while spiral_length < self.length:
-      turn +=1
-
-      # Spiral #1
-      pts = []
+    for turn in range(turns):
       # local radius:
-      r = 2*b + a * turn * 2 * pi - self.wg_width/2
-      # number of points per circle:
-      npoints = int(points_per_circle(r))
-      # increment, in radians, for each point:
-      da = 2 * pi / npoints  
-      # draw the inside edge of spiral
-      for i in range(0, npoints+1):
-        t = i*da
-        xa = (a*t + r) * cos(t);
-        ya = (a*t + r) * sin(t);
-        pts.append(Point.from_dpoint(DPoint(xa/dbu, ya/dbu)))
-      # draw the outside edge of spiral
-      r = 2*b + a * turn * 2 * pi + self.wg_width/2
-      npoints = int(points_per_circle(r))
-      da = 2 * pi / npoints  
-      for i in range(npoints, -1, -1):
-        t = i*da
-        xa = (a*t + r) * cos(t);
-        ya = (a*t + r) * sin(t);
-        pts.append(Point.from_dpoint(DPoint(xa/dbu, ya/dbu)))
-      polygon = Polygon(pts)
-      area += polygon.area()
-      shapes(LayerSiN).insert(polygon)
-
+      r = 2*b + a * turn * 2 * pi
+      # Spiral #1
+      inner, outer = archimedes_arm(a, r - self.wg_width/2, r + self.wg_width/2, 0, 2*pi)
+      spiral_ribbon(shapes(LayerSiN), inner, outer, dbu)
       # Spiral #2
-      pts = []
-      # local radius:
-      r = 2*b + a * turn * 2 * pi - self.wg_width/2 - spacing
-      # number of points per circle:
-      npoints = int(points_per_circle(r))
-      # increment, in radians, for each point:
-      da = 2 * pi / npoints  
-      # draw the inside edge of spiral
-      for i in range(0, npoints+1):
-        t = i*da + pi
-        xa = (a*t + r) * cos(t);
-        ya = (a*t + r) * sin(t);
-        pts.append(Point.from_dpoint(DPoint(xa/dbu, ya/dbu)))
-      # draw the outside edge of spiral
-      r = 2*b + a * turn * 2 * pi + self.wg_width/2  - spacing
-      npoints = int(points_per_circle(r))
-      da = 2 * pi / npoints  
-      for i in range(npoints, -1, -1):
-        t = i*da + pi
-        xa = (a*t + r) * cos(t);
-        ya = (a*t + r) * sin(t);
-        pts.append(Point.from_dpoint(DPoint(xa/dbu, ya/dbu)))
-      polygon = Polygon(pts)
-      area += polygon.area()
-      shapes(LayerSiN).insert(polygon)
-
-      # waveguide length:
-      spiral_length = area / self.wg_width * dbu*dbu + 2 * pi * self.min_radius
+      inner, outer = archimedes_arm(a, r - self.wg_width/2 - spacing, r + self.wg_width/2 - spacing, pi, 2*pi)
+      spiral_ribbon(shapes(LayerSiN), inner, outer, dbu)
+    turn = turns - 1
 
     if self.spiral_ports:
       # Spiral #1 extra 1/2 arm
-      turn = turn + 1
-      pts = []
-      # local radius:
-      r = 2*b + a * turn * 2 * pi - self.wg_width/2
-      # number of points per circle:
-      npoints = int(points_per_circle(r))
-      # increment, in radians, for each point:
-      da = pi / npoints  
-      # draw the inside edge of spiral
-      for i in range(0, npoints+1):
-        t = i*da
-        xa = (a*t + r) * cos(t);
-        ya = (a*t + r) * sin(t);
-        pts.append(Point.from_dpoint(DPoint(xa/dbu, ya/dbu)))
-      # draw the outside edge of spiral
-      r = 2*b + a * turn * 2 * pi + self.wg_width/2
-      npoints = int(points_per_circle(r))
-      da = pi / npoints  
-      for i in range(npoints, -1, -1):
-        t = i*da
-        xa = (a*t + r) * cos(t);
-        ya = (a*t + r) * sin(t);
-        pts.append(Point.from_dpoint(DPoint(xa/dbu, ya/dbu)))
-      polygon = Polygon(pts)
-      area += polygon.area()
-      shapes(LayerSiN).insert(polygon)
-      turn = turn - 1
-      # waveguide length:
-      spiral_length = area / self.wg_width * dbu*dbu + 2 * pi * self.min_radius
+      r = 2*b + a * turns * 2 * pi
+      inner, outer = archimedes_arm(a, r - self.wg_width/2, r + self.wg_width/2, 0, pi)
+      spiral_ribbon(shapes(LayerSiN), inner, outer, dbu)
 
     # Centre S-shape connecting waveguide        
     #layout_arc_wg_dbu(self.cell, LayerSiN, -b/dbu, 0, b/dbu, self.wg_width/dbu, 0, 180)
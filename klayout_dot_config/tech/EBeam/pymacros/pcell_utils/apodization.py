@@ -0,0 +1,123 @@
+"""
+Apodization profiles, chirped periods and positions of grating periods.
+
+The apodized gratings (Bragg gratings, contra-directional couplers) vary the
+corrugation width of period i along the grating, as a function of
+u = (i - N/2)/N, from -1/2 to 1/2, and of an apodization index a:
+
+  Gaussian       exp(-0.5*(2*a*u)**2)
+  Raised cosine  ((1 + cos(2*pi*u))/2)**a
+  Tanh           tanh(2*a*(1/2 - |u|))/tanh(a)
+  Custom         an expression of u and a, e.g. "1 - (2*u)**2"
+
+The profiles are 1 at the centre, and 1 everywhere for a = 0.  They are
+calculated for all the periods at once, with NumPy when it is available
+(and one period at a time otherwise), and returned as lists, since the pya
+shapes take Python numbers.
+
+Units: dbu, except for the arguments in microns (with dbu).
+"""
+
+import math
+from itertools import accumulate
+
+try:
+  import numpy
+  MODULE_NUMPY = True
+except ImportError:
+  MODULE_NUMPY = False
+
+# the profiles f(i, N, a, xp) of the periods i of a grating of N periods, for
+# arrays i (xp = numpy) or numbers (xp = math); a != 0
+PROFILES = {
+  "Gaussian": lambda i, N, a, xp: xp.exp( -0.5*(2*a*(i-N/2)/(N))**2 ),
+  "Raised cosine": lambda i, N, a, xp: ((1 + xp.cos(2*math.pi*(i-N/2)/N))/2)**a,
+  "Tanh": lambda i, N, a, xp: xp.tanh(2*a*(0.5 - abs((i-N/2)/N)))/math.tanh(a),
+}
+
+# profile of the gap of the coupler apodized contra-DC, exp(-a*u**2)
+def gap_profile(i, N, a, xp):
+  return xp.exp( (-a*(i-0.5*N)**2)/(N**2) )
+
+# choices of the PCell parameters
+PROFILE_CHOICES = [[name, name] for name in PROFILES] + [["Custom", "Custom"]]
+
+
+def _evaluate(f, count):
+  # f(i, xp) for i = 0 .. count-1, as an array (or a list, without NumPy)
+  if MODULE_NUMPY:
+    return f(numpy.arange(count), numpy) + numpy.zeros(count)
+  return [f(i, math) for i in range(count)]
+
+
+def _rounded(values):
+  # the values rounded to ints (halves to even, as round()), as a list
+  if MODULE_NUMPY:
+    return numpy.rint(values).astype(int).tolist()
+  return [int(round(value)) for value in values]
+
+
+def _floats(values):
+  return values.tolist() if MODULE_NUMPY else list(values)
+
+
+def custom_profile(expression):
+  # profile f(i, N, a, xp) of an expression of u = (i - N/2)/N and a, with
+  # the functions of math / numpy (exp, cos, sqrt, pi, ...)
+  code = compile(expression, "apodization profile", "eval")
+  def f(i, N, a, xp):
+    names = dict((name, getattr(xp, name)) for name in ("exp", "log", "sqrt", "sin", "cos", "tanh", "cosh", "pi"))
+    names.update(u = (i-N/2)/N, a = a, abs = abs)
+    return eval(code, {"__builtins__": {}}, names)
+  return f
+
+
+def _profile(profile, index, expression):
+  # the function f(i, N, a, xp) of a profile, or None for no apodization
+  if profile == "Custom":
+    return custom_profile(expression)
+  if callable(profile):
+    return profile
+  return PROFILES[profile] if index != 0 else None
+
+
+def profile_factors(N, index, profile = "Gaussian", count = None, expression = "", scale = 1):
+  # apodization factors (times scale) of the periods i = 0 .. count-1
+  # (default: N) of a grating of N periods, as a list
+  # profile: name in PROFILES, "Custom" (with expression) or a function f(i, N, a, xp)
+  count = N if count is None else count
+  f = _profile(profile, index, expression)
+  if f is None:
+    return [scale*1.0]*count
+  return _floats(_evaluate(lambda i, xp: scale*f(i, N, index, xp), count))
+
+
+def positions(count, period, dbu = 1, offset = 0):
+  # positions round(i*period/dbu + offset) of the periods i = 0 .. count-1
+  return _rounded(_evaluate(lambda i, xp: i*period/dbu + offset, count))
+
+
+def chirped_periods(N, period, period_end, dbu, count = None):
+  # periods (dbu) of the periods i = 0 .. count-1 (default: N), going
+  # linearly from period (i = 0) towards period_end (i = N), in microns
+  start = int(round(period/dbu))
+  step = ((int(round(period_end/dbu)) - start) * 1.0 / N)
+  return _rounded(_evaluate(lambda i, xp: start+i*step, N if count is None else count))
+
+
+def apodized_grating(N, period, corrugation, dbu, index = 0, profile = "Gaussian", period_end = None, count = None, expression = ""):
+  # positions, periods and corrugation widths (dbu) of the periods
+  # i = 0 .. count-1 (default: N) of an apodized grating of N periods
+  # period, corrugation: microns; the corrugation is rounded to dbu before the apodization
+  # period_end: chirped grating, from period to period_end; the periods are
+  #   placed one after the other, x[i] = x[i-1] + periods[i]
+  # returns the lists x, periods, widths
+  count = N if count is None else count
+  if period_end is None:
+    x = positions(count, period, dbu)
+    periods = [int(round(period/dbu))]*count
+  else:
+    periods = chirped_periods(N, period, period_end, dbu, count)
+    x = [0] + list(accumulate(periods[1:]))
+  widths = profile_factors(N, index, profile, count, expression, scale = int(round(corrugation/dbu)))
+  return x, periods, widths
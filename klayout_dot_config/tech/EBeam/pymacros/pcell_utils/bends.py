@@ -0,0 +1,134 @@
+"""
+Cache of waveguide bend geometry, shared by the PCells of the EBeam libraries.
+
+The routed waveguides of a chip mostly use a few bend radii (from
+WAVEGUIDES.xml) and 90 degree turns, and every bend of every Waveguide PCell
+used to calculate its points again.  The bends are now calculated once per
+(radius, angle, bezier, DevRec, dbu), and kept in a process-wide cache that
+drops the least recently used bends over BEND_CACHE.maxsize.
+
+The cached bends are tuples of pya.Point, shared by all the PCells: they
+must not be modified.  points() returns copies of them, transformed to their
+place in the layout.
+
+Units: radius in dbu, angles in degrees.
+"""
+
+import pya
+from collections import OrderedDict
+
+
+class BendCache:
+  # LRU cache of bends, with counters of the cache hits and misses
+
+  def __init__(self, maxsize = 1024):
+    self.maxsize = maxsize
+    self.bends = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key, calculate):
+    # returns the bend for key, or calls calculate() and caches its result
+    bend = self.bends.get(key)
+    if bend is not None:
+      self.hits += 1
+      self.bends.move_to_end(key)
+      return bend
+    self.misses += 1
+    bend = tuple(calculate())
+    self.bends[key] = bend
+    if len(self.bends) > self.maxsize:
+      self.bends.popitem(last = False)
+    return bend
+
+  def clear(self):
+    self.bends.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def __repr__(self):
+    return "BendCache(%d bends, %d hits, %d misses)" % (len(self.bends), self.hits, self.misses)
+
+
+BEND_CACHE = BendCache()
+
+
+# The SiEPIC.utils arc functions are called as the PCells always have, without
+# their dbu argument (which older SiEPIC-Tools don't have): the points are
+# those of their default dbu.  dbu is only part of the cache keys.
+
+def arc_bend(radius, angle, DevRec = False, dbu = 0.001):
+  # circular bend, turning left by angle from (-radius, 0), with the centre at (-radius, radius)
+  # as SiEPIC.utils.arc_xy(-radius, radius, radius, 270, 270+angle)
+  def calculate():
+    from SiEPIC.utils import arc_xy
+    return arc_xy(-radius, radius, radius, 270, 270 + angle, DevRec = DevRec)
+  return BEND_CACHE.get((radius, angle, None, bool(DevRec), dbu), calculate)
+
+
+def quarter_arc(radius, dbu = 0.001):
+  # quarter circle around (0, 0), from 270 to 360 degrees
+  # as SiEPIC.utils.arc(radius, 270, 360), e.g. for Waveguide_Bend
+  def calculate():
+    from SiEPIC.utils import arc
+    return arc(radius, 270, 360)
+  return BEND_CACHE.get((radius, 90, "arc", False, dbu), calculate)
+
+
+def bezier_controls(radius, angle, bezier):
+  # control points of the Bezier bend turning left by angle from (-radius, 0),
+  # to the end of the arc bend of the same radius: the inner points are at
+  # (1 - bezier) of the way from the ends to the corner of the tangents
+  # (the points of SiEPIC.utils.arc_bezier, for 90 degrees)
+  from math import pi, cos, sin, tan
+  a = angle/180.*pi
+  L = radius*tan(a/2)
+  x, y = -radius + radius*sin(a), radius - radius*cos(a)
+  return [(-radius, 0), (-radius + (1 - bezier)*L, 0), (x - (1 - bezier)*L*cos(a), y - (1 - bezier)*L*sin(a)), (x, y)]
+
+
+def bezier_bend(radius, angle, bezier, DevRec = False, dbu = 0.001):
+  # Bezier bend from (-radius, 0), turning left by angle, to the end of the arc bend;
+  # at 90 degrees, as SiEPIC.utils.arc_bezier(radius, 270, 360, bezier), which
+  # only draws 90 degree bends; other angles with the same number of points
+  bezier = float(bezier)
+  def calculate():
+    from SiEPIC.utils import arc_bezier, points_per_circle
+    if angle == 90:
+      return arc_bezier(radius, 270, 270 + angle, bezier, DevRec = DevRec)
+    N = int(points_per_circle(radius/1000)/4/(3 if DevRec else 1))
+    if N < 5:
+      N = 100
+    p = bezier_controls(radius, angle, bezier)
+    pts = []
+    for i in range(0, N):
+      t = float(i)/(N - 1)
+      c = [(1-t)**3, 3*(1-t)**2*t, 3*(1-t)*t**2, t**3]
+      pts.append(pya.Point(sum(c[k]*p[k][0] for k in range(4)), sum(c[k]*p[k][1] for k in range(4))))
+    return pts
+  return BEND_CACHE.get((radius, angle, bezier, bool(DevRec), dbu), calculate)
+
+
+def arc_directions(radius, theta_start, theta):
+  # unit vectors (cos, sin) along an arc from theta_start, over theta, with
+  # the number of points of SiEPIC.utils.points_per_circle(radius)
+  # (e.g. for the inner and outer edges of the s-bends)
+  def calculate():
+    from math import pi, cos, sin
+    from SiEPIC.utils import points_per_circle
+    circle_fraction = abs(theta) / 360.0
+    npoints = int(points_per_circle(radius) * circle_fraction)
+    if npoints == 0:
+      npoints = 1
+    da = 2 * pi / npoints * circle_fraction # increment, in radians
+    th = theta_start / 360.0 * 2 * pi
+    return [(cos(i*da+th), sin(i*da+th)) for i in range(0, npoints+1)]
+  return BEND_CACHE.get((radius, (theta_start, theta), None, False, None), calculate)
+
+
+def points(bend, trans = None):
+  # copy of the bend points (list of pya.Point), transformed by trans (pya.Trans) if given
+  path = pya.Path(bend, 0)
+  if trans is not None:
+    path = path.transformed(trans)
+  return list(path.each_point())
@@ -0,0 +1,132 @@
+"""
+Library bundles: the GDS files of a library, merged into one compressed OASIS file.
+
+Reading and merging the GDS files is most of the startup time of the
+libraries.  After reading them, a library writes the result as one OASIS
+file in the on-disk cache (pcell_utils.cache), named by the hash of the
+contents of the files, with a manifest of the files (path, size,
+modification time and SHA-1).  The next time, the library reads the bundle
+instead, if the manifest still matches the files: the sizes and times are
+compared first, and the contents only of the files whose time changed
+(e.g. after a git checkout).
+
+The bundles are written and read only when the cache is enabled, and not
+in the lazy mode of pcell_utils.fixed_cells.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import pya
+from pcell_utils import cache
+
+
+def bundle_dir():
+  return os.path.join(cache.cache_dir(), "bundles")
+
+
+def _manifest_path(name):
+  return os.path.join(bundle_dir(), "%s.json" % name)
+
+
+def _bundle_path(name, digest):
+  return os.path.join(bundle_dir(), "%s.%s.oas" % (name, digest[:16]))
+
+
+def _sha1(path):
+  h = hashlib.sha1()
+  with open(path, "rb") as f:
+    for block in iter(lambda: f.read(1 << 20), b""):
+      h.update(block)
+  return h.hexdigest()
+
+
+def manifest(files, previous = None):
+  # size, modification time and SHA-1 of the files, and the digest of their
+  # contents; the SHA-1 of the files with the same size and time as in the
+  # previous manifest are taken from it
+  known = {}
+  if previous is not None:
+    known = dict(((f["path"], f["size"], f["mtime"]), f["sha1"]) for f in previous["files"])
+  entries = []
+  for path in files:
+    st = os.stat(path)
+    sha1 = known.get((path, st.st_size, st.st_mtime)) or _sha1(path)
+    entries.append({"path": path, "size": st.st_size, "mtime": st.st_mtime, "sha1": sha1})
+  digest = hashlib.sha1("".join(f["sha1"] for f in entries).encode("utf-8")).hexdigest()
+  return {"files": entries, "digest": digest}
+
+
+def _write(path, write):
+  # writes a file through a temporary file, so that readers never see it half written
+  fd, tmp = tempfile.mkstemp(suffix = os.path.splitext(path)[1], dir = bundle_dir())
+  os.close(fd)
+  try:
+    write(tmp)
+    os.replace(tmp, path)
+  finally:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+
+
+def _write_manifest(name, current):
+  def write(tmp):
+    with open(tmp, "w") as f:
+      json.dump(current, f)
+  _write(_manifest_path(name), write)
+
+
+def load_bundle(layout, name, files):
+  # reads the bundle of the library name into layout, if it is up to date
+  # with the files; returns False otherwise, with the layout unchanged
+  if not cache.enabled():
+    return False
+  try:
+    with open(_manifest_path(name), "r") as f:
+      previous = json.load(f)
+    if [f["path"] for f in previous["files"]] != list(files):
+      return False
+    current = manifest(files, previous)
+    bundle = _bundle_path(name, current["digest"])
+    if current["digest"] != previous["digest"] or not os.path.exists(bundle):
+      return False
+  except Exception:
+    return False
+  print(" - reading %s" % bundle)
+  try:
+    layout.read(bundle)
+  except Exception:
+    layout.clear()
+    return False
+  if current != previous:
+    # same contents, new times
+    try:
+      _write_manifest(name, current)
+    except Exception:
+      pass
+  return True
+
+
+def save_bundle(layout, name, files):
+  # writes the layout, read from the files, as the bundle of the library name;
+  # the cache is best effort, so errors are ignored
+  if not cache.enabled():
+    return
+  try:
+    current = manifest(files)
+    if not os.path.isdir(bundle_dir()):
+      os.makedirs(bundle_dir())
+    options = pya.SaveLayoutOptions()
+    options.format = "OASIS"
+    options.oasis_compression_level = 10
+    options.oasis_write_cblocks = True
+    _write(_bundle_path(name, current["digest"]), lambda tmp: layout.write(tmp, options))
+    _write_manifest(name, current)
+    # older bundles of the library
+    for filename in os.listdir(bundle_dir()):
+      path = os.path.join(bundle_dir(), filename)
+      if filename.startswith(name + ".") and filename.endswith(".oas") and path != _bundle_path(name, current["digest"]):
+        os.remove(path)
+  except Exception:
+    pass
@@ -0,0 +1,152 @@
+"""
+On-disk cache of PCell tables that are slow to calculate.
+
+Some PCells spend most of their time on tables that only depend on a few of
+their parameters (e.g. the grating angles of the spiral Bragg gratings), and
+KLayout re-evaluates the PCells every time a layout is opened.  These tables
+are stored as one .npz file per key in a versioned cache directory, and the
+least recently used files are removed when the directory grows over
+MAX_BYTES.  Small tables that are not arrays (e.g. the index of the cells in
+the GDS files of the libraries) are stored as .json files, and do not need
+NumPy.
+
+Environment variables:
+  SIEPIC_EBEAM_CACHE=0        disables the cache
+  SIEPIC_EBEAM_CACHE_DIR      cache location, by default ~/.klayout/SiEPIC_EBeam_cache
+
+Bump CACHE_VERSION when a change to the calculations makes the stored tables
+stale; the older versions are then deleted.
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import json
+
+CACHE_VERSION = 1
+
+# size limit of the cache directory, bytes
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def enabled():
+  return os.environ.get("SIEPIC_EBEAM_CACHE", "1") != "0"
+
+
+def cache_dir():
+  root = os.environ.get("SIEPIC_EBEAM_CACHE_DIR",
+                        os.path.join(os.path.expanduser("~"), ".klayout", "SiEPIC_EBeam_cache"))
+  return os.path.join(root, "v%d" % CACHE_VERSION)
+
+
+def _path(name, key, ext = ".npz"):
+  # repr() keeps every digit of the float parameters
+  digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+  return os.path.join(cache_dir(), "%s-%s%s" % (name, digest, ext))
+
+
+def load_array(name, key):
+  # returns the array stored for (name, key), or None
+  if not enabled():
+    return None
+  import numpy
+  path = _path(name, key)
+  try:
+    with numpy.load(path) as data:
+      if data["key"].item() != repr(key):
+        return None
+      array = data["array"]
+    os.utime(path)  # most recently used
+    return array
+  except Exception:
+    return None
+
+
+def save_array(name, key, array):
+  # stores the array for (name, key); the cache is best effort, so errors
+  # (e.g. a read-only home directory) are ignored
+  if not enabled():
+    return
+  import numpy
+  def write(f):
+    numpy.savez(f, key = numpy.array(repr(key)), array = array)
+  _save(_path(name, key), write)
+
+
+def _save(path, write):
+  # writes a cache file through a temporary file, so that readers never see it half written
+  try:
+    new_dir = not os.path.isdir(cache_dir())
+    if new_dir:
+      os.makedirs(cache_dir())
+      _remove_old_versions()
+    fd, tmp = tempfile.mkstemp(suffix = os.path.splitext(path)[1], dir = cache_dir())
+    with os.fdopen(fd, "wb") as f:
+      write(f)
+    os.replace(tmp, path)
+    _evict()
+  except Exception:
+    pass
+
+
+def cached_array(name, key, calculate):
+  # returns the cached array for (name, key), or calls calculate() and caches its result
+  import numpy
+  array = load_array(name, key)
+  if array is None:
+    array = numpy.asarray(calculate())
+    save_array(name, key, array)
+  return array
+
+
+def load_json(name, key):
+  # returns the table (list, dict, ...) stored for (name, key), or None
+  if not enabled():
+    return None
+  path = _path(name, key, ".json")
+  try:
+    with open(path, "r") as f:
+      data = json.load(f)
+    if data["key"] != repr(key):
+      return None
+    os.utime(path)  # most recently used
+    return data["table"]
+  except Exception:
+    return None
+
+
+def save_json(name, key, table):
+  # stores the table (anything json can write) for (name, key); errors are ignored
+  if not enabled():
+    return
+  def write(f):
+    f.write(json.dumps({"key": repr(key), "table": table}).encode("utf-8"))
+  _save(_path(name, key, ".json"), write)
+
+
+def _evict():
+  # removes the least recently used files until the cache fits in MAX_BYTES
+  files = []
+  for filename in os.listdir(cache_dir()):
+    path = os.path.join(cache_dir(), filename)
+    if filename.endswith(".npz") or filename.endswith(".json"):
+      st = os.stat(path)
+      files.append((st.st_mtime, st.st_size, path))
+  total = sum(f[1] for f in files)
+  for mtime, size, path in sorted(files):
+    if total <= MAX_BYTES:
+      break
+    try:
+      os.remove(path)
+      total -= size
+    except OSError:
+      pass
+
+
+def _remove_old_versions():
+  root = os.path.dirname(cache_dir())
+  current = os.path.basename(cache_dir())
+  for d in os.listdir(root):
+    if d.startswith("v") and d != current:
+      shutil.rmtree(os.path.join(root, d), ignore_errors = True)
@@ -0,0 +1,124 @@
+"""
+Emission of long waveguide outlines as polygons with a bounded number of vertices.
+
+GDS limits a polygon to 8191 points (including the closing point), and long
+spirals and waveguides easily go over that.  Other tools split or reject such
+polygons, and booleans on them are slow, so the PCells insert their outlines
+in abutting pieces instead.
+
+A waveguide outline is given as its two sides, with matching points facing
+each other (edge1[k] across the waveguide from edge2[k]).  The outline is cut
+along these cross-sections, so that consecutive pieces share the seam
+edge1[k]-edge2[k] exactly: no gaps, no overlaps, and the same total area.
+Not every cross-section is inside the outline: on the zigzag walls of a
+grating, the cross-section at the wide points of a period runs along the
+steps of both walls, and once the points are rounded to dbu, it leaves the
+outline by a sliver.  The cuts are made at cross-sections that point into
+the outline at both ends instead, e.g. the narrow points of the period, or
+from edge1[k] to a neighbour of edge2[k] (edge2[k-1] or edge2[k+1]) where
+the walls step the same way, as in the shifted waveguides of a contra-DC.
+
+The outlines of straight corrugated waveguides (insert_outline) have sides
+with points at different x (e.g. misaligned grating teeth), and are cut
+vertically instead.
+"""
+
+import pya
+
+# maximum number of vertices per polygon, as for GDS
+MAX_VERTICES = 8190
+
+
+def _cross(u, v):
+  return u.x*v.y - u.y*v.x
+
+
+def _inward(a, p, q, d, sign):
+  # True if the direction d from the vertex a (between p and q along the
+  # outline) points strictly into the outline; sign: 1 if the outline is
+  # counterclockwise, -1 otherwise
+  c1 = sign*_cross(a - p, d)
+  c2 = sign*_cross(q - a, d)
+  if sign*_cross(a - p, q - a) > 0:
+    return c1 > 0 and c2 > 0
+  return c1 > 0 or c2 > 0
+
+
+def _orientation(edge1, edge2):
+  # 1 if the outline edge1 + reversed(edge2) is counterclockwise, -1 otherwise
+  pts = edge1 + edge2[::-1]
+  area = sum(_cross(pts[i-1], pts[i]) for i in range(0, len(pts)))
+  return 1 if area > 0 else -1
+
+
+def insert_ribbon(shapes, edge1, edge2, max_vertices = MAX_VERTICES):
+  # inserts the polygon edge1 + reversed(edge2) into shapes, split into
+  # abutting polygons of at most max_vertices, as they are created
+  # shapes: pya.Shapes to insert into
+  # edge1, edge2: lists of pya.Point of equal length, the two sides of the outline
+  # returns the total area (dbu^2), e.g. to find the waveguide length
+  if len(edge1) != len(edge2):
+    raise Exception("Both sides of the outline must have the same number of points")
+  step = max(max_vertices//2 - 1, 1)
+  sign = _orientation(edge1, edge2) if len(edge1) > step + 1 else 1
+  # twice the area: Polygon.area rounds each piece down
+  area2 = 0
+  i0, j0 = 0, 0
+  while i0 < len(edge1)-1 or j0 < len(edge2)-1:
+    i1 = j1 = min(min(i0, j0) + step, len(edge1)-1)
+    if i1 < len(edge1)-1:
+      # the last cut up to i1 inside the outline, in the second half of the
+      # piece (otherwise the cross-section at i1)
+      cuts = ((k1, k2) for k in range(i1, min(i0, j0) + step//2, -1) for k1, k2 in ((k, k), (k, k-1), (k-1, k)))
+      for k1, k2 in cuts:
+        d = edge2[k2] - edge1[k1]
+        if k1 > i0 and k2 > j0 and _inward(edge1[k1], edge1[k1-1], edge1[k1+1], d, sign) and _inward(edge2[k2], edge2[k2+1], edge2[k2-1], -d, sign):
+          i1, j1 = k1, k2
+          break
+    polygon = pya.Polygon(edge1[i0:i1+1] + edge2[j0:j1+1][::-1])
+    shapes.insert(polygon)
+    area2 += polygon.area2()
+    i0, j0 = i1, j1
+  return area2//2
+
+
+def insert_outline(shapes, edge1, edge2, max_vertices = MAX_VERTICES):
+  # inserts the polygon edge1 + reversed(edge2) into shapes, for two sides
+  # along x (x not decreasing; e.g. the sides of a corrugated waveguide),
+  # split into abutting polygons of at most max_vertices, cut across the
+  # outline at points of edge1; the sides need not have matching points
+  # (the cuts are vertical, and fall on edge2 by linear interpolation)
+  # returns the number of polygons
+  if len(edge1) + len(edge2) <= max_vertices:
+    shapes.insert(pya.Polygon(edge1 + edge2[::-1]))
+    return 1
+  from bisect import bisect_right
+  xs2 = [p.x for p in edge2]
+  step = max(max_vertices//2 - 1, 1)
+  count = 0
+  i0, j0, start2 = 0, 0, []
+  while True:
+    i1 = min(i0 + step, len(edge1)-1)
+    while True:
+      if i1 == len(edge1)-1:
+        side2, next_j0, next_start2 = start2 + edge2[j0:], None, None
+      else:
+        x = edge1[i1].x
+        j1 = bisect_right(xs2, x, j0) - 1
+        if j1 >= j0 and xs2[j1] == x:
+          side2, next_j0, next_start2 = start2 + edge2[j0:j1+1], j1, []
+        else:
+          # the cut is between two points of edge2
+          p1 = edge2[j1] if j1 >= j0 else start2[0]
+          p2 = edge2[j1+1]
+          y = p1.y + (p2.y - p1.y)*(x - p1.x)/float(p2.x - p1.x)
+          seam = pya.Point(x, int(round(y)))
+          side2, next_j0, next_start2 = start2 + edge2[j0:j1+1] + [seam], j1+1, [seam]
+      if (i1 - i0 + 1) + len(side2) <= max_vertices or i1 == i0 + 1:
+        break
+      i1 = i0 + max((i1 - i0)//2, 1)
+    shapes.insert(pya.Polygon(edge1[i0:i1+1] + side2[::-1]))
+    count += 1
+    if next_j0 is None:
+      return count
+    i0, j0, start2 = i1, next_j0, next_start2
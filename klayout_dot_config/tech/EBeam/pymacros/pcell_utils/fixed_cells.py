@@ -0,0 +1,174 @@
+"""
+Fixed GDS cells of the EBeam libraries, read on demand.
+
+The libraries read all the GDS files of their folders when KLayout starts,
+which is slow on network home directories.  In the lazy mode (the default),
+a library only indexes the top cells of its files at startup (the index is
+kept in the on-disk cache, pcell_utils.cache, by file size and modification
+time), and reads a file into its layout the first time one of its cells is
+needed:
+  - create_cell(layout, name, library) reads the files with the cell, and
+    creates it in layout, as Layout.create_cell(name, library), which only
+    finds the cells already read (scripts call create_cell instead);
+  - in KLayout, the files left are read when the first layout view is
+    created or opened, so the library browser lists the cells;
+  - load(library, layouts) reads the files left, e.g. in a batch script.
+
+The cells are the same static cells of the library in both modes, read from
+the same files, so that layouts refer to them the same way.  A layout read
+before the files of its fixed cells keeps their saved content, and load()
+links it to the library again (Library.refresh, KLayout 0.27.8).
+
+Environment variables:
+  SIEPIC_EBEAM_LAZY_GDS=0     reads the files at startup (from their bundle,
+                              pcell_utils.bundle, when it is up to date)
+"""
+
+import os
+import struct
+import pya
+from pcell_utils import cache
+from pcell_utils.bundle import load_bundle, save_bundle
+
+# GDS record types
+ENDLIB = 0x04
+STRNAME = 0x06
+SNAME = 0x12
+
+# cell that KLayout writes for its own meta data
+CONTEXT_INFO = "$$$CONTEXT_INFO$$$"
+
+# the libraries in the lazy mode, by name
+_libraries = {}
+
+# the files of the libraries not read yet, by library name: {path: top cell names}
+_pending = {}
+
+
+def lazy():
+  return os.environ.get("SIEPIC_EBEAM_LAZY_GDS", "1") != "0"
+
+
+def register_gds(library, files, library_name):
+  # makes the cells of the GDS files available in the library (library_name):
+  # by reading them, from their bundle if it is up to date (pcell_utils.bundle),
+  # or in the lazy mode, by indexing their top cells, to read them on demand
+  # (the files that can't be indexed are read)
+  if not lazy():
+    if load_bundle(library.layout(), library_name, files):
+      return
+    for path in files:
+      print(" - reading %s" % path)
+      library.layout().read(path)
+    save_bundle(library.layout(), library_name, files)
+    return
+  pending = {}
+  for path in files:
+    names = top_cells(path)
+    if names is None:
+      print(" - reading %s" % path)
+      library.layout().read(path)
+    else:
+      print(" - indexing %s" % path)
+      pending[path] = names
+  _libraries[library_name] = library
+  _pending[library_name] = pending
+  _load_on_first_view()
+
+
+def _read(library_name, paths):
+  # reads the files (not read yet) into the library; returns True if any was read
+  pending = _pending.get(library_name, {})
+  paths = [path for path in paths if path in pending]
+  for path in paths:
+    print(" - reading %s" % path)
+    _libraries[library_name].layout().read(path)
+    del pending[path]
+  return len(paths) > 0
+
+
+def create_cell(layout, name, library_name):
+  # the fixed cell name of the library library_name, in layout, as
+  # Layout.create_cell(name, library_name); in the lazy mode, the files
+  # with the cell as a top cell are read first (all the files left, for
+  # the other cells)
+  pending = _pending.get(library_name, {})
+  _read(library_name, [path for path in list(pending) if name in pending[path]])
+  cell = layout.create_cell(name, library_name)
+  if cell is None and pending:
+    load(library_name)
+    cell = layout.create_cell(name, library_name)
+  return cell
+
+
+def _unresolved(layout):
+  # True if layout has library cells that are not linked to their library,
+  # e.g. fixed cells of files not read yet (they keep their saved content)
+  return any(cell.is_proxy() and not cell.is_library_cell() and not cell.is_pcell_variant() for cell in layout.each_cell())
+
+
+def load(library_name = None, layouts = ()):
+  # reads the files left of the library library_name (of all the libraries,
+  # by default); the fixed cells of layouts read before are then linked to
+  # the library again (Library.refresh, which also creates the child cells
+  # of the library cells again, so it is only called when needed)
+  libraries = [name for name in ([library_name] if library_name else list(_pending)) if _read(name, list(_pending.get(name, {})))]
+  if libraries and any(_unresolved(layout) for layout in layouts):
+    for name in libraries:
+      if hasattr(_libraries[name], "refresh"):
+        _libraries[name].refresh()
+
+
+# True once load is connected to the layout views of KLayout
+_view_hook = False
+
+
+def _load_on_first_view():
+  # in KLayout, reads the files left when a layout view is created or opened
+  global _view_hook
+  if _view_hook:
+    return
+  main_window = pya.Application.instance().main_window() if hasattr(pya, "Application") else None
+  if main_window is None:
+    return
+  def layouts():
+    views = [main_window.view(i) for i in range(0, main_window.views())]
+    return [view.cellview(i).layout() for view in views for i in range(0, view.cellviews())]
+  main_window.on_view_created += lambda index: load(layouts = layouts())
+  _view_hook = True
+
+
+def top_cells(path):
+  # names of the top cells of a GDS file, from the index cache, or None
+  try:
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime)
+    names = cache.load_json("gds_index", key)
+    if names is None:
+      names = scan_gds(path)
+      cache.save_json("gds_index", key, names)
+    return names
+  except Exception:
+    return None
+
+
+def scan_gds(path):
+  # names of the top cells of a GDS file, in the order of the file, from its
+  # structure names (STRNAME) and references (SNAME)
+  with open(path, "rb") as f:
+    data = f.read()
+  cells = []
+  referenced = set()
+  i = 0
+  while i + 4 <= len(data):
+    size, rectype = struct.unpack(">HB", data[i:i+3])
+    if size < 4:
+      raise Exception("Invalid GDS record in %s" % path)
+    if rectype == STRNAME:
+      cells.append(data[i+4:i+size].rstrip(b"\0").decode("latin-1"))
+    elif rectype == SNAME:
+      referenced.add(data[i+4:i+size].rstrip(b"\0").decode("latin-1"))
+    elif rectype == ENDLIB:
+      break
+    i += size
+  return [name for name in cells if name not in referenced and name != CONTEXT_INFO]
@@ -0,0 +1,95 @@
+"""
+Teeth and taper of the focusing grating couplers.
+
+The focusing grating couplers (fswgc, swg_fc) are made of teeth along
+confocal ellipses, r = N*lambda_0/(n_e*(1 - e*cos(theta))) + offset, over
+the taper angle: in each period a small and a big tooth, each between the
+arcs at r and at r + width, then the taper from the first ellipse to the
+waveguide.  The points of the arcs of all the periods are calculated at
+once, with NumPy when it is available, as 2-D arrays (one row per period,
+padded to the longest arc), and are the same as those calculated one by
+one: the number of points of each arc keeps the vertex error under 0.5 nm
+(arc_points).
+
+Units: microns, except for dbu.
+"""
+
+import math
+import pya
+from pcell_utils.polygons import arc_points
+
+try:
+  import numpy
+  MODULE_NUMPY = True
+except ImportError:
+  MODULE_NUMPY = False
+
+
+def _rounded(values):
+  # values (dbu) rounded as pya.Point.from_dpoint, halves away from zero, as (nested) lists
+  if MODULE_NUMPY:
+    values = numpy.asarray(values)
+    return numpy.trunc(values + numpy.where(values > 0, 0.5, -0.5)).astype(int).tolist()
+  return [int(value + 0.5) if value > 0 else int(value - 0.5) for value in values]
+
+
+def _polygon(xs, ys):
+  return pya.Polygon(list(map(pya.Point, xs, ys)))
+
+
+def focusing_grating(length, n_e, e, angle_e, period, spacing, wl, wh, number, t, dbu):
+  # the polygons (pya.Polygon) of a focusing grating coupler of number
+  # periods: the small and the big tooth of each period, then the taper
+  # length: N*lambda_0, e: eccentricity, of the ellipses
+  # angle_e: taper angle (degrees); wl, wh: widths of the small and big teeth
+  # spacing: between the teeth; t: width of the waveguide
+  start = (math.pi - (math.pi/180)*angle_e/2)
+  stop = (math.pi + (math.pi/180)*angle_e/2)
+
+  # number of segments of the arcs of each period, such that the vertex &
+  # edge placement error is < 0.5 nm (see points_per_circle)
+  segments = [arc_points((length / (n_e*(1 - e)) + j*period + spacing)/dbu, angle_e*math.pi/180, dbu) for j in range(0, number)]
+
+  # the inner and outer arcs of the teeth, x and y (dbu), per period
+  teeth = []
+  if MODULE_NUMPY:
+    m = numpy.arange(max(segments) + 1)
+    theta = start + m*(stop - start)/numpy.array(segments)[:, None]
+    cos, sin = numpy.cos(theta), numpy.sin(theta)
+    base = length / (n_e*(1 - e*cos))
+    j = numpy.arange(number)[:, None]
+    for r, w in ((base + j*period + spacing, wl), (base + j*period + 2*spacing + wl, wh)):
+      teeth.append([_rounded(a/dbu) for a in (r*cos, r*sin, (r + w)*cos, (r + w)*sin)])
+    # the taper, from the first ellipse, with the arc of the last period
+    n = segments[-1] + 1
+    xl = (base[-1][:n]*cos[-1][:n]).tolist()[::-1]
+    yl = (base[-1][:n]*sin[-1][:n]).tolist()[::-1]
+  else:
+    teeth = [([], [], [], []), ([], [], [], [])]
+    for j in range(0, number):
+      theta = [start + m*(stop - start)/segments[j] for m in range(0, segments[j] + 1)]
+      cos, sin = [math.cos(th) for th in theta], [math.sin(th) for th in theta]
+      base = [length / (n_e*(1 - e*c)) for c in cos]
+      for rows, r, w in ((teeth[0], [b + j*period + spacing for b in base], wl), (teeth[1], [b + j*period + 2*spacing + wl for b in base], wh)):
+        rows[0].append(_rounded([r[k]*cos[k]/dbu for k in range(0, len(r))]))
+        rows[1].append(_rounded([r[k]*sin[k]/dbu for k in range(0, len(r))]))
+        rows[2].append(_rounded([(r[k] + w)*cos[k]/dbu for k in range(0, len(r))]))
+        rows[3].append(_rounded([(r[k] + w)*sin[k]/dbu for k in range(0, len(r))]))
+    xl = [base[k]*cos[k] for k in range(0, len(base))][::-1]
+    yl = [base[k]*sin[k] for k in range(0, len(base))][::-1]
+
+  # each tooth: the inner arc, then the outer arc, reversed
+  polygons = []
+  for j in range(0, number):
+    n = segments[j] + 1
+    for x1, y1, x2, y2 in teeth:
+      polygons.append(_polygon(x1[j][:n] + x2[j][n-1::-1], y1[j][:n] + y2[j][n-1::-1]))
+
+  # the taper, to the waveguide at x = 0
+  yl_abs = [abs(y) for y in yl]
+  iy_max = yl_abs.index(max(yl_abs))
+  L_o = (yl_abs[iy_max] - t/2)/math.tan((math.pi/180)*angle_e/2)
+  xr = [L_o + xl[iy_max], 0, 0, L_o + xl[iy_max]]
+  yr = [t/2., t/2., -t/2., -t/2.]
+  polygons.append(_polygon(_rounded([x/dbu for x in xr + xl]), _rounded([y/dbu for y in yr + yl])))
+  return polygons
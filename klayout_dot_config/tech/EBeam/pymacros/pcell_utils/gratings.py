@@ -0,0 +1,270 @@
+"""
+Uniform gratings as an array of one period, and sinusoidal teeth from templates.
+
+The grating PCells (Bragg gratings, contra-directional couplers,
+sub-wavelength gratings) insert the shapes of every period, e.g. 4 boxes per
+period, i.e. thousands of shapes for a long grating.  When all the periods
+are the same, the shapes of one period are put in a cell instead, placed
+with a regular CellInstArray, which the GDS writers, DRC and viewers keep as
+one instance.  The cells of the periods are shared by the PCells of a layout
+with the same periods, and deleted once no PCell uses them (shared_cell).
+In apodized gratings, the periods with the same shapes (the corrugation
+widths rounded to dbu repeat along the grating), and the blocks of periods
+repeated along sub-wavelength gratings of varying period or width, share
+their cells in the same way.
+
+The sinusoidal teeth of a grating (SineTeeth) are built once per period and
+amplitude, and moved into place, instead of from the sine of every point of
+every period.
+
+Corrugated waveguides can also be inserted as one outline (Outline), instead
+of the boxes of their teeth, which DRC, the invert-tone macro and e-beam
+fracturing would otherwise merge again.
+
+Units: dbu.
+"""
+
+import hashlib
+import math
+from collections import Counter
+import pya
+from pcell_utils.emission import insert_outline
+
+
+def uniform_pitch(xs):
+  # the pitch of the positions xs (ints) if they are equally spaced, otherwise None
+  if len(xs) < 2:
+    return None
+  pitch = xs[1] - xs[0]
+  if pitch <= 0:
+    return None
+  for i in range(2, len(xs)):
+    if xs[i] - xs[i-1] != pitch:
+      return None
+  return pitch
+
+
+def integer_pitch(period):
+  # period (dbu, float) as an int, if it is a whole number of dbu, otherwise None
+  pitch = int(round(period))
+  return pitch if pitch > 0 and abs(period - pitch) < 1e-6 else None
+
+
+# names of the cells made by shared_cell
+_shared_cells = set()
+
+
+def shared_cell(layout, cell_name, fill):
+  # static cell cell_name of the layout, a child cell of the PCell variants
+  # that use it; created with fill(cell) if it doesn't exist.  KLayout has no
+  # cells private to a variant: when the variants are deleted (e.g. by the
+  # library, once no layout uses them), their shared cells stay as top cells,
+  # so the ones left without a parent are deleted first
+  cell = layout.cell(cell_name)
+  if cell is not None:
+    return cell
+  for name in list(_shared_cells):
+    orphan = layout.cell(name)
+    if orphan is not None and not orphan.is_proxy() and orphan.parent_cells() == 0:
+      orphan.delete()
+  _shared_cells.add(cell_name)
+  cell = layout.create_cell(cell_name)
+  fill(cell)
+  return cell
+
+
+def period_cell(layout, layer, shapes, name):
+  # cell with the shapes (pya.Box, pya.Polygon) of one period on layer, shared
+  # by the PCells of the layout with the same period (see shared_cell)
+  key = (str(layout.get_info(layer)), [str(shape) for shape in shapes], layout.dbu)
+  cell_name = "%s_period_%s" % (name, hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:8])
+  def fill(cell):
+    for shape in shapes:
+      cell.shapes(layer).insert(shape)
+  return shared_cell(layout, cell_name, fill)
+
+
+def insert_periods(cell, layer, shapes, pitch, number, name):
+  # inserts the shapes of one period number times, at pitch along x, as an
+  # array of a period cell
+  if number < 2:
+    for i in range(0, number):
+      for shape in shapes:
+        cell.shapes(layer).insert(shape)
+    return
+  period = period_cell(cell.layout(), layer, shapes, name)
+  cell.insert(pya.CellInstArray(period.cell_index(), pya.Trans(), pya.Vector(pitch, 0), pya.Vector(0, 0), number, 1))
+
+
+# the longest block of periods looked for, repeated along a grating
+MAX_BLOCK = 16
+
+
+def _repeats(ids, xs, i, p):
+  # the number of times the block of periods i .. i+p-1 is repeated from i,
+  # at a constant pitch (1 if it isn't)
+  if i + 2*p > len(ids) or xs[i+p] <= xs[i]:
+    return 1
+  pitch = xs[i+p] - xs[i]
+  k = i + p
+  while k < len(ids) and ids[k] == ids[k-p] and xs[k] - xs[k-p] == pitch:
+    k += 1
+  return (k - i)//p
+
+
+def insert_grating(cell, layer, period, xs, name, uniform = True, repeats = False):
+  # inserts the periods of a grating: period(i) is the list of shapes of the
+  # period at xs[i]; uniform gratings (the same shapes at equally spaced xs)
+  # as an array of the first period; otherwise, with repeats, the blocks of
+  # periods (up to MAX_BLOCK) repeated at a constant pitch as arrays of
+  # shared cells, the other periods that have the same shapes as instances
+  # of a shared period cell, and the periods that don't repeat flat
+  pitch = uniform_pitch(xs) if uniform else None
+  if pitch:
+    insert_periods(cell, layer, period(0), pitch, len(xs), name)
+    return
+  if not repeats:
+    for i in range(0, len(xs)):
+      for shape in period(i):
+        cell.shapes(layer).insert(shape)
+    return
+  # the shapes of the periods, moved to x = 0 to compare them, and numbered
+  shapes = [period(i) for i in range(0, len(xs))]
+  keys = [tuple(shape.moved(-xs[i], 0) for shape in shapes[i]) for i in range(0, len(xs))]
+  numbers = {}
+  ids = [numbers.setdefault(key, len(numbers)) for key in keys]
+  counts = Counter(ids)
+  cells = {}
+  i = 0
+  while i < len(xs):
+    # the block repeated over the most periods from i
+    block, number = 1, 1
+    for p in range(1, MAX_BLOCK+1):
+      if i + 2*p > len(xs) or block*number == len(xs) - i:
+        break
+      r = _repeats(ids, xs, i, p)
+      if r > 1 and r*p > block*number:
+        block, number = p, r
+    if number == 1 and counts[ids[i]] == 1:
+      for shape in shapes[i]:
+        cell.shapes(layer).insert(shape)
+      i += 1
+      continue
+    key = tuple(ids[i:i+block]) + tuple(xs[k] - xs[i] for k in range(i, i+block))
+    if key not in cells:
+      block_shapes = [shape.moved(xs[k] - xs[i], 0) for k in range(i, i+block) for shape in keys[k]]
+      cells[key] = period_cell(cell.layout(), layer, block_shapes, name).cell_index()
+    if number > 1:
+      cell.insert(pya.CellInstArray(cells[key], pya.Trans(xs[i], 0), pya.Vector(xs[i+block] - xs[i], 0), pya.Vector(0, 0), number, 1))
+    else:
+      cell.insert(pya.CellInstArray(cells[key], pya.Trans(xs[i], 0)))
+    i += block*number
+
+
+class SineTeeth:
+  """
+  Sinusoidal teeth of a grating, from one template per period and amplitude.
+
+  A tooth is the polygon between the axis of the waveguide and its side over
+  one period: (0, 0), (x_k, half_w + a*sin(2*pi*k/n)) for k = 0 .. n,
+  (period, 0); the tooth of the other side is its mirror image.  The teeth
+  are built once for each period and amplitude a, with the sines calculated
+  once, and moved to the periods.  The amplitudes of apodized gratings are
+  all different, but are few once the points are rounded to dbu; the teeth
+  of the same rounded points are the same template.
+
+  npoints: n, the number of segments per period (sine_points)
+  half_w: half the width of the waveguide
+  rounded: the points rounded to dbu (otherwise truncated, as pya.Point)
+  """
+
+  def __init__(self, npoints, half_w, rounded = True):
+    self.angles = [i1 * 2*math.pi / npoints for i1 in range(0, npoints+1)]
+    self.sines = [math.sin(angle) for angle in self.angles]
+    self.half_w = half_w
+    self.rounded = rounded
+    self._teeth = {}
+    self._templates = {}
+
+  def teeth(self, period, amplitude):
+    # the upper and the lower tooth (pya.Polygon) of the period at x = 0
+    teeth = self._teeth.get((period, amplitude))
+    if teeth is None:
+      ys = [amplitude*sine for sine in self.sines]
+      if self.rounded:
+        ys = [round(y) for y in ys]
+      key = (period, tuple(ys))
+      teeth = self._templates.get(key)
+      if teeth is None:
+        xs = [angle/2/math.pi*period for angle in self.angles]
+        if self.rounded:
+          xs = [round(x) for x in xs]
+        pts = [pya.Point(0, 0)] + [pya.Point(xs[k], self.half_w + ys[k]) for k in range(0, len(xs))] + [pya.Point(period, 0)]
+        upper = pya.Polygon(pts)
+        teeth = self._templates[key] = (upper, upper.transformed(pya.Trans.M0))
+      self._teeth[(period, amplitude)] = teeth
+    return teeth
+
+  def period(self, x, period, amplitude, misalignment = 0, flipped = False):
+    # the teeth of the period at x (int): the upper one at x, the lower one
+    # at x + misalignment; flipped: the lower one at x, the upper one at
+    # x + misalignment (e.g. the second waveguide of a contra-DC)
+    upper, lower = self.teeth(period, amplitude)
+    if flipped:
+      upper, lower = lower, upper
+    return [upper.moved(x, 0), lower.moved(int(x + misalignment), 0)]
+
+
+class Outline:
+  """
+  Outline of a straight corrugated waveguide along x, from the shapes that
+  make it up in the flat layout: boxes, and polygons such as sinusoidal
+  teeth, each between the axis of the waveguide and one side.
+
+  The pieces of each side are joined in x order, into one edge; consecutive
+  pieces share their boundary (the start of the next piece), so the 1 dbu
+  gaps and overlaps of rounded positions are closed.  The sides are then
+  inserted as one polygon (or a few, under the GDS vertex limit).
+
+  trans: displacement (pya.Trans) of the axis of the waveguide from y = 0,
+  e.g. for the second waveguide of a contra-DC
+  """
+
+  def __init__(self, trans = None):
+    self.trans = trans
+    self.sides = ([], [])
+
+  def add(self, shape, trans = None):
+    # adds a pya.Box or pya.Polygon of the waveguide; trans: the axis of
+    # this shape, if it isn't that of the waveguide (e.g. a varying gap)
+    trans = trans or self.trans
+    axis = trans.disp.y if trans is not None else 0
+    if isinstance(shape, pya.Box):
+      if shape.top > axis:
+        self.sides[0].append([shape.p1 + pya.Vector(0, shape.height()), shape.p2])
+      else:
+        self.sides[1].append([shape.p1, shape.p2 - pya.Vector(0, shape.height())])
+      return
+    # the points off the axis, from left to right
+    pts = list(shape.each_point_hull())
+    k = [i for i in range(len(pts)) if pts[i].y == axis][-1]
+    pts = [p for p in pts[k+1:] + pts[:k+1] if p.y != axis]
+    if pts[0].x > pts[-1].x:
+      pts.reverse()
+    self.sides[0 if pts[0].y > axis else 1].append(pts)
+
+  def edge(self, side):
+    # the points of a side (list of pya.Point), from left to right
+    pieces = sorted(self.sides[side], key = lambda piece: piece[0].x)
+    pts = []
+    for k in range(0, len(pieces)-1):
+      last = pieces[k][-1]
+      pts += pieces[k][:-1]
+      pts.append(pya.Point(pieces[k+1][0].x, last.y))
+    return pts + pieces[-1]
+
+  def insert(self, shapes):
+    # inserts the outline into shapes; returns the number of polygons
+    if not self.sides[0] or not self.sides[1]:
+      return 0
+    return insert_outline(shapes, self.edge(0), self.edge(1))
@@ -0,0 +1,96 @@
+"""
+PCell declarations built on first use.
+
+The libraries register many PCells, and building each declaration (and
+importing the modules of some of them, e.g. PCMSpiral_PCells and
+photonic_crystals with NumPy) is part of the startup time of KLayout, even
+for the PCells that are never used.  A LazyPCell is registered instead: it
+builds the real declaration the first time KLayout needs it, i.e. when the
+PCell is instantiated, or its parameters are shown (library browser, PCell
+dialog), and then passes all the calls to it.
+
+KLayout only calls the declarations after the registration, so the PCells
+look the same to the layouts and the library browser.
+"""
+
+import sys
+import importlib
+import pya
+
+# modules to import again on first use, after the library macro is run again
+# (to install changes to their code)
+_reload = set()
+
+
+def reload_on_use(*modules):
+  # the modules of the LazyPCells that are already imported are reloaded,
+  # the first time one of their PCells is used
+  _reload.update(name for name in modules if name in sys.modules)
+
+
+def _import(name):
+  module = importlib.import_module(name)
+  if name in _reload:
+    _reload.discard(name)
+    module = importlib.reload(module)
+  return module
+
+
+class LazyPCell(pya.PCellDeclaration):
+  """
+  Proxy of a PCell declaration, built on first use.
+
+  declaration: class of the declaration, or its name in module (module name)
+  """
+
+  def __init__(self, declaration, module = None):
+    super(LazyPCell, self).__init__()
+    self.declaration = declaration
+    self.module = module
+    self._pcell = None
+
+  def pcell(self):
+    # the real declaration
+    if self._pcell is None:
+      declaration = self.declaration
+      if self.module is not None:
+        declaration = getattr(_import(self.module), declaration)
+      self._pcell = declaration()
+    return self._pcell
+
+  def __getattr__(self, name):
+    # other attributes of the declaration (e.g. its parameter descriptors)
+    if name.startswith("_"):
+      raise AttributeError(name)
+    return getattr(self.pcell(), name)
+
+  def get_parameters(self):
+    return self.pcell().get_parameters()
+
+  def get_layers(self, parameters):
+    return self.pcell().get_layers(parameters)
+
+  def callback(self, layout, name, states):
+    return self.pcell().callback(layout, name, states)
+
+  def coerce_parameters(self, layout, parameters):
+    return self.pcell().coerce_parameters(layout, parameters)
+
+  def produce(self, layout, layers, parameters, cell):
+    return self.pcell().produce(layout, layers, parameters, cell)
+
+  def can_create_from_shape(self, layout, shape, layer):
+    return self.pcell().can_create_from_shape(layout, shape, layer)
+
+  def transformation_from_shape(self, layout, shape, layer):
+    return self.pcell().transformation_from_shape(layout, shape, layer)
+
+  def parameters_from_shape(self, layout, shape, layer):
+    return self.pcell().parameters_from_shape(layout, shape, layer)
+
+  def display_text(self, parameters):
+    return self.pcell().display_text(parameters)
+
+  def cell_name(self, parameters):
+    # the real declaration isn't registered, so it has no name of its own
+    return self.pcell().cell_name(parameters) or self.name()
@@ -0,0 +1,52 @@
+"""
+Polygonization of curved PCell geometry, from an edge placement error budget.
+
+Rather than a fixed number of points (n_vertices, npoints, npoints_sin, ...),
+the curved PCells ask these functions how many points are needed so that the
+polygon edges stay within max_error of the ideal curve, in the same way as
+SiEPIC.utils.points_per_circle.
+
+Units: lengths in dbu, max_error in nm.
+"""
+
+import math
+
+# default edge placement error budget, nm
+MAX_ERROR = 0.5
+
+
+def _error_dbu(dbu, max_error):
+  return max_error * 1e-3 / dbu
+
+
+def arc_points(r, angle = 2*math.pi, dbu = 0.001, max_error = MAX_ERROR):
+  # number of segments for an arc of radius r (dbu) spanning angle (radians),
+  # such that the sagitta of each chord is less than max_error (nm)
+  e = _error_dbu(dbu, max_error)
+  if r <= e:
+    return 4
+  step = 2*math.acos(1 - e/r)
+  return max(4, int(math.ceil(abs(angle)/step)))
+
+
+def circle_points(r, dbu = 0.001, max_error = MAX_ERROR):
+  # number of vertices for a full circle of radius r (dbu), rounded up to a
+  # multiple of 4 to keep the circle symmetric in x and y
+  n = arc_points(r, 2*math.pi, dbu, max_error)
+  return max(8, int(math.ceil(n/4.)*4))
+
+
+def sine_points(amplitude, period, dbu = 0.001, max_error = MAX_ERROR):
+  # number of segments per period for y = amplitude*sin(2*pi*x/period)
+  # (amplitude and period in dbu).  The chord error on a curve with curvature
+  # k is k*L^2/8, using the maximum curvature of the sine, amplitude*(2*pi/period)^2.
+  # Rounded up to a multiple of 4, so that the peaks and zeros are vertices.
+  e = _error_dbu(dbu, max_error)
+  amplitude = abs(amplitude)
+  if amplitude <= e or period <= 0:
+    return 4
+  k = 2*math.pi/period
+  chord = math.sqrt(8*e/(amplitude*k*k))
+  length = period*math.sqrt(1 + (amplitude*k)**2)
+  n = int(math.ceil(length/chord))
+  return max(4, int(math.ceil(n/4.)*4))
@@ -0,0 +1,82 @@
+"""
+Rings, half rings and their couplers from one quarter or half of their arcs.
+
+The rings of the ring PCells (DoubleBus_Ring, Bent_Coupled_Half_Ring) and
+the arcs of the half ring couplers (ebeam_dc_halfring_straight,
+DirectionalCoupler_SeriesRings) are symmetric about the y axis, and the
+full rings also about the x axis.  Only one quarter (ring) or one half
+(arc) of their points is calculated, and the rest are its mirror images or
+rotations.  pya.Point.from_dpoint rounds the halves away from zero, so the
+points are the same as those calculated one by one, as in
+SiEPIC.utils.arc_wg_xy, up to the last bit of the cosines, for the centres
+on the grid (or at x = 0 for the mirror images about the y axis).  As the
+arcs of SiEPIC.utils, the polygons are cached, and shared by the PCells:
+they must not be modified.
+
+Units: dbu, angles in degrees.
+"""
+
+import math
+import pya
+from functools import lru_cache
+from SiEPIC.utils import points_per_circle
+
+
+def _round(v):
+  # as pya.Point.from_dpoint: halves away from zero
+  return int(v + 0.5) if v > 0 else int(v - 0.5)
+
+
+def _arcs(x, y, radii, theta_start, da, npoints):
+  # x and y (lists) of the points of arcs of radii around (x, y), from
+  # theta_start (degrees), of npoints segments of da (radians)
+  th = math.radians(theta_start)
+  cos = [math.cos(i*da + th) for i in range(0, npoints+1)]
+  sin = [math.sin(i*da + th) for i in range(0, npoints+1)]
+  return [([_round(x + r*c) for c in cos], [_round(y + r*s) for s in sin]) for r in radii]
+
+
+def _polygon(outer, inner):
+  # polygon of the outer arc, then the inner arc reversed
+  return pya.Polygon(list(map(pya.Point, outer[0] + inner[0][::-1], outer[1] + inner[1][::-1])))
+
+
+def mirrored(polygon):
+  # mirror image of a polygon about the y axis, e.g. the arc from 180 to 270
+  # degrees around (-x, y) from the arc from 270 to 360 degrees around (x, y)
+  return polygon.transformed(pya.Trans.M90)
+
+
+@lru_cache(maxsize = 1024)
+def symmetric_arc_wg(x, y, r, w, angle, theta = 90, dbu = 0.001):
+  # waveguide arc around (x, y) from theta - angle to theta + angle (theta = 90
+  # or 270), as SiEPIC.utils.arc_wg_xy(x, y, r, w, theta-angle, theta+angle):
+  # the points up to theta, and their mirror images about x
+  # x: on the grid
+  npoints = max(1, int(points_per_circle(r/1000, dbu = dbu) * 2*angle / 360.0))
+  da = math.radians(2*angle)/npoints
+  arcs = _arcs(x, y, (r + w/2, r - w/2), theta - angle, da, npoints//2)
+  for xs, ys in arcs:
+    n = npoints - npoints//2
+    xs += [2*x - v for v in xs[n-1::-1]]
+    ys += ys[n-1::-1]
+  return _polygon(*arcs)
+
+
+@lru_cache(maxsize = 1024)
+def ring(x, y, r, w, npoints):
+  # full ring of radius r and width w around (x, y), of npoints segments, with
+  # a cut at 0 degrees: the first quarter, and its rotations when npoints is a
+  # multiple of 4 and the centre is on the grid
+  da = 2*math.pi/npoints
+  cx, cy = int(round(x)), int(round(y))
+  if npoints % 4 or abs(x - cx) > 1e-6 or abs(y - cy) > 1e-6:
+    return _polygon(*_arcs(x, y, (r + w/2, r - w/2), 0, da, npoints))
+  arcs = _arcs(cx, cy, (r + w/2, r - w/2), 0, da, npoints//4)
+  for xs, ys in arcs:
+    # rotations by 90, 180 and 270 degrees around (cx, cy)
+    u = [v - cx for v in xs[1:]]
+    v = [v - cy for v in ys[1:]]
+    xs += [cx - t for t in v] + [cx - t for t in u] + [cx + t for t in v]
+    ys += [cy + t for t in u] + [cy - t for t in v] + [cy - t for t in u]
+  return _polygon(*arcs)
@@ -0,0 +1,130 @@
+"""
+Technology of the PCells, read once per change of its files.
+
+The PCells get the SiEPIC technology (layers, etc.) in their __init__ and
+in produce_impl, i.e. on every regeneration.  SiEPIC reads the layer
+properties of the technology each time (or, in newer versions, only the
+first time, and never again).  cached_technology() reads it, and the
+WAVEGUIDES.xml, DFT.xml and MONTECARLO.xml files of the technology folder,
+the first time, and again only when the modification time of one of these
+files, of the .lyt file or of its layer properties (.lyp) changes.
+
+The layer indices of the technology layers in a layout (e.g. the library
+layout, where the PCells are produced) are also kept, by layout:
+TECHNOLOGY.layers(layout)['Si'], or TECHNOLOGY.layer(layout, 'Si').  A layer
+is added to a layout when it is first used, as with
+layout.layer(TECHNOLOGY['Si']).
+"""
+
+import os
+import weakref
+import pya
+
+XML_FILES = ("WAVEGUIDES.xml", "DFT.xml", "MONTECARLO.xml")
+
+# technologies read so far, by name
+_technologies = {}
+
+
+def cached_technology(tech_name = "EBeam"):
+  # the technology tech_name, read again if its files have changed
+  technology = _technologies.get(tech_name)
+  if technology is None or technology.changed():
+    technology = Technology(tech_name)
+    _technologies[tech_name] = technology
+  return technology
+
+
+def _mtime(path):
+  try:
+    return os.stat(path).st_mtime
+  except OSError:
+    return None
+
+
+class Technology(dict):
+  """
+  SiEPIC technology, as SiEPIC.utils.get_technology_by_name(tech_name), with
+  the layer indices by layout, and the waveguides, DFT and Monte Carlo
+  definitions of the technology folder.
+  """
+
+  def __init__(self, tech_name):
+    from SiEPIC.utils import get_technology_by_name
+    # bypasses the cache of newer SiEPIC versions, which isn't updated
+    get_technology_by_name = getattr(get_technology_by_name, "__wrapped__", get_technology_by_name)
+    tech = pya.Technology.technology_by_name(tech_name)
+    base_path = tech.base_path()
+    self.files = [os.path.join(base_path, "%s.lyt" % tech_name), tech.eff_layer_properties_file()]
+    self.files += [os.path.join(base_path, filename) for filename in XML_FILES]
+    self.mtimes = [_mtime(path) for path in self.files]
+    super(Technology, self).__init__(get_technology_by_name(tech_name))
+    self._layers = weakref.WeakKeyDictionary()
+    self._xml = {}
+
+  def changed(self):
+    return [_mtime(path) for path in self.files] != self.mtimes
+
+  def layers(self, layout):
+    # indices of the technology layers in layout, by name (LayerIndices)
+    layers = self._layers.get(layout)
+    if layers is None or not layers.valid(layout):
+      layers = self._layers[layout] = LayerIndices(self, layout)
+    return layers
+
+  def layer(self, layout, name):
+    # index of the layer name in layout
+    return self.layers(layout)[name]
+
+  def _read_xml(self, filename):
+    # contents of an XML file of the technology folder (dict), or None
+    if filename not in self._xml:
+      from SiEPIC.utils import xml_to_dict
+      path = os.path.join(self['base_path'], filename)
+      self._xml[filename] = None
+      if os.path.exists(path):
+        with open(path, 'r') as f:
+          self._xml[filename] = xml_to_dict(f.read())
+    return self._xml[filename]
+
+  @property
+  def waveguides(self):
+    # waveguide types, as SiEPIC.utils.load_Waveguides_by_Tech(tech_name)
+    if 'waveguides' not in self._xml:
+      from SiEPIC.utils import load_Waveguides_by_Tech
+      self._xml['waveguides'] = load_Waveguides_by_Tech(self['technology_name'])
+    return self._xml['waveguides']
+
+  @property
+  def dft(self):
+    # design for test rules, from DFT.xml
+    return self._read_xml("DFT.xml")
+
+  @property
+  def montecarlo(self):
+    # Monte Carlo parameters (list of technologies), as SiEPIC.utils.load_Monte_Carlo()
+    montecarlo = self._read_xml("MONTECARLO.xml")
+    if montecarlo is None:
+      return None
+    montecarlo = montecarlo['technologies']['technology']
+    return montecarlo if isinstance(montecarlo, list) else [montecarlo]
+
+
+class LayerIndices(dict):
+  """
+  Indices of the layers of a technology in a layout, by layer name,
+  resolved on first use.
+  """
+
+  def __init__(self, technology, layout):
+    super(LayerIndices, self).__init__()
+    self.technology = technology
+    self.layout = weakref.ref(layout)
+
+  def __missing__(self, name):
+    index = self[name] = self.layout().layer(self.technology[name])
+    return index
+
+  def valid(self, layout):
+    # False if a layer was deleted from the layout since
+    return all(layout.is_valid_layer(index) for index in self.values())
@@ -0,0 +1,80 @@
+"""
+Waveguide edges offset from a single centerline.
+
+Waveguide types can have many components (layers, each with a width and an
+offset; e.g. 9 for "eskid TE 1550" in WAVEGUIDES.xml).  The PCells build the
+centerline with its bends once, and get the edges of all the components from
+it in one pass, with the same normals and manhattan ends as
+SiEPIC.utils.translate_from_normal.  NumPy is used when it is available,
+otherwise each edge falls back to translate_from_normal.
+
+The bend lengths are also here, for the waveguide lengths calculated along
+with the path instead of from the polygon areas.
+
+Units: dbu.
+"""
+
+import pya
+from math import atan2, cos, sin, pi, sqrt
+from functools import lru_cache
+
+try:
+  import numpy
+  MODULE_NUMPY = True
+except ImportError:
+  MODULE_NUMPY = False
+
+
+def offset_centerline(pts, offsets):
+  # pts: centerline, list of pya.Point
+  # offsets: distances of the edges from the centerline, to the left (negative: to the right)
+  # returns one list of pya.Point per offset, as translate_from_normal(pts, offset)
+  if not MODULE_NUMPY or len(pts) < 2:
+    from SiEPIC.utils import translate_from_normal
+    return [translate_from_normal(pts, offset) for offset in offsets]
+
+  xy = numpy.array([[p.x, p.y] for p in pts], dtype = float)
+
+  # normals, from the two neighbouring points; the operations are those of
+  # translate_from_normal, so that the points round the same way
+  dpt = numpy.ones_like(xy)
+  dpt[1:-1] = (xy[2:] - xy[:-2])*(2/(1./(len(xy) - 1)))
+  normal = numpy.column_stack((-dpt[:, 1], dpt[:, 0]))
+  scale = numpy.asarray(offsets, dtype = float)[:, None]/numpy.sqrt(dpt[:, 0]*dpt[:, 0] + dpt[:, 1]*dpt[:, 1])[None, :]
+
+  # all the edges at once: edges[k] = xy + normal*offsets[k]/|normal|
+  edges = xy[None, :, :] + normal[None, :, :]*scale[:, :, None]
+
+  # the ends, from the first and last segments, made manhattan; as in
+  # translate_from_normal, so that 45 degree ends snap the same way
+  for end, segment in ((0, xy[1] - xy[0]), (-1, xy[-1] - xy[-2])):
+    a0 = atan2(segment[1], segment[0])/pi*180*pi/180
+    for k, offset in enumerate(offsets):
+      a = a0 + (pi/2 if offset > 0 else -pi/2)
+      x, y = xy[end] + (abs(offset)*cos(a), abs(offset)*sin(a))
+      if abs(x - xy[end, 0]) > abs(y - xy[end, 1]):
+        edges[k, end] = (x, xy[end, 1])
+      else:
+        edges[k, end] = (xy[end, 0], y)
+
+  # round half away from zero, as DPoint.to_itype
+  edges = numpy.trunc(edges + numpy.copysign(0.5, edges)).astype(int)
+  return [[pya.Point(x, y) for x, y in edge] for edge in edges.tolist()]
+
+
+@lru_cache(maxsize = 64)
+def bezier_length(bezier, angle = 90, intervals = 256):
+  # length of the Bezier bend of pcell_utils.bends.bezier_bend (at 90 degrees,
+  # the SiEPIC.utils.arc_bezier curve), for a unit radius
+  # (Simpson's rule on the speed of the cubic Bezier curve)
+  from pcell_utils.bends import bezier_controls
+  xp, yp = zip(*bezier_controls(1, angle, bezier))
+  def speed(t):
+    dx = 3*(1-t)**2*(xp[1]-xp[0]) + 6*(1-t)*t*(xp[2]-xp[1]) + 3*t**2*(xp[3]-xp[2])
+    dy = 3*(1-t)**2*(yp[1]-yp[0]) + 6*(1-t)*t*(yp[2]-yp[1]) + 3*t**2*(yp[3]-yp[2])
+    return sqrt(dx*dx + dy*dy)
+  h = 1./intervals
+  total = speed(0) + speed(1)
+  for i in range(1, intervals):
+    total += (4 if i % 2 else 2)*speed(i*h)
+  return total*h/3
@@ -0,0 +1,72 @@
+"""
+Triangular lattice sites for the photonic crystal PCells.
+
+The PCells describe the lattice in hole indices (i, j): row j is at
+y = j*sqrt(3)/2, and consecutive rows are offset by half a period.  In the
+"half" rows the holes sit at x = sign(i)*(|i|-0.5), i != 0, and in the other
+rows at x = i.  All coordinates are in units of the lattice constant, so
+multiply by a (in dbu) before placing the holes.
+
+Defects are applied as array operations on the whole lattice:
+  - boolean masks built from i and j, to drop holes (waveguides, bus),
+  - a shift table {(i, j): (dx, dy)}, to move the holes around a cavity.
+"""
+
+import math
+import numpy
+
+
+def triangular_lattice(n_x, n_y, half_rows = 0):
+  # n_x: holes i = -n_x .. n_x in each row
+  # n_y: rows j = -n_y .. n_y
+  # half_rows: parity (0 or 1) of the rows holding the half-period holes
+  # returns (i, j, x, y) numpy arrays with one entry per hole, row by row
+  i = numpy.arange(-n_x, n_x+1)
+  j = numpy.arange(-n_y, n_y+1)
+  jj, ii = numpy.meshgrid(j, i, indexing = 'ij')
+  half = (jj % 2 == half_rows)
+
+  # the half-period rows have no hole at i = 0
+  keep = ~(half & (ii == 0))
+  ii = ii[keep]
+  jj = jj[keep]
+  half = half[keep]
+
+  x = numpy.where(half, numpy.sign(ii)*(numpy.abs(ii)-0.5), ii).astype(float)
+  y = jj*math.sqrt(3)/2
+  return ii, jj, x, y
+
+
+def shift_sites(i, j, x, y, shifts, mask = True):
+  # shifts: {(i, j): (dx, dy)}, in units of the lattice constant
+  # mask: only shift the holes selected by this mask
+  # moves the matching holes in place, and returns the mask of shifted holes
+  shifted = numpy.zeros(i.shape, dtype = bool)
+  for (i0, j0), (dx, dy) in shifts.items():
+    site = (i == i0) & (j == j0) & mask
+    x[site] += dx
+    y[site] += dy
+    shifted |= site
+  return shifted
+
+
+def cavity_shifts(Sx, Sy = (), x_start = 1):
+  # shift table for the holes around a cavity centred on the origin
+  # Sx: outward x shifts of the holes (x_start, 0), (x_start+1, 0), ...
+  # Sy: outward y shifts of the holes (0, 1), (0, 2), ...
+  shifts = {}
+  for k in range(len(Sx)):
+    shifts[(x_start+k, 0)] = (Sx[k], 0)
+    shifts[(-x_start-k, 0)] = (-Sx[k], 0)
+  for k in range(len(Sy)):
+    shifts[(0, k+1)] = (0, Sy[k])
+    shifts[(0, -k-1)] = (0, -Sy[k])
+  return shifts
+
+
+def lattice_points(x, y, a, mask = None):
+  # [x, y] positions of the selected holes (all by default), scaled by the lattice constant a
+  points = numpy.column_stack((x, y))
+  if mask is not None:
+    points = points[mask]
+  return (points*a).tolist()
@@ -77,10 +77,17 @@ Version history:
 from pya import *
 import pya
 import math
+import os
 
 from SiEPIC.utils import get_technology, get_technology_by_name
 from SiEPIC.utils import arc, arc_wg, arc_to_waveguide, points_per_circle
 
+from .lattice import triangular_lattice, shift_sites, cavity_shifts, lattice_points
+from pcell_utils.polygons import arc_points, circle_points
+from pcell_utils.grating_couplers import focusing_grating
+from pcell_utils.technology import cached_technology
+from pcell_utils.gratings import period_cell, integer_pitch
+
 
 # -------------------------------------------------------------------------------------------------------------------------------------------------- #
 # -------------------------------------------------------------------------------------------------------------------------------------------------- #
@@ -118,7 +125,7 @@ class swg_fc_test(pya.PCellDeclarationHelper):
 
     
     # Layer parameters
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -174,7 +181,7 @@ class swg_fc_test(pya.PCellDeclarationHelper):
         # calculate such that the vertex & edge placement error is < 0.5 nm.
         #   see "SiEPIC_EBeam_functions - points_per_circle" for more details
         radius = N*lambda_0 / ( self.n_e*( 1 - e )) + j*self.period + spacing
-        seg_points = int(points_per_circle(radius/dbu)/360.*self.angle_e) # number of points grating arc
+        seg_points = arc_points(radius/dbu, self.angle_e*pi/180, dbu) # number of points grating arc
         theta_up = []
         for m in range(seg_points+1):    
           theta_up = theta_up + [start + m*(stop-start)/seg_points]
@@ -336,7 +343,7 @@ class swg_fc(pya.PCellDeclarationHelper):
     self.param("w_scale", self.TypeDouble, "Width Scale", default = 1.0)
     
     # Layer parameters
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -392,115 +399,10 @@ class swg_fc(pya.PCellDeclarationHelper):
     N = round(self.taper_length*(1+e)*self.n_e/lambda_0) ##allows room for the taper
 
     start = (pi - (pi/180)*self.angle_e/2)
-    stop = (pi + (pi/180)*self.angle_e/2)
-              
-    # Draw coupler grating.
-    for j in range(gc_number):
-
-        # number of points in the arcs:
-        # calculate such that the vertex & edge placement error is < 0.5 nm.
-        #   see "SiEPIC_EBeam_functions - points_per_circle" for more details
-        radius = N*lambda_0 / ( self.n_e*( 1 - e )) + j*self.period + spacing
-        seg_points = int(points_per_circle(radius/dbu)/360.*self.angle_e) # number of points grating arc
-        theta_up = []
-        for m in range(seg_points+1):    
-          theta_up = theta_up + [start + m*(stop-start)/seg_points]
-        theta_down = theta_up[::-1]
-
-        ##small one
-        r_up = []
-        r_down = []
-        for k in range(len(theta_up)):
-          r_up = r_up + [N*lambda_0 / ( self.n_e*( 1 - e*cos(float(theta_up[k])) )) + j*self.period + spacing]
-        r_down = r_up[::-1]
-    
-        xr = []
-        yr = []
-        for k in range(len(theta_up)):
-          xr = xr + [r_up[k]*cos(theta_up[k])]
-          yr = yr + [r_up[k]*sin(theta_up[k])]
-    
-        xl = []
-        yl = []
-        for k in range(len(theta_down)):
-          xl = xl + [(r_down[k] + wl)*cos(theta_down[k])]
-          yl = yl + [(r_down[k] + wl)*sin(theta_down[k])]
-    
-        x = xr + xl
-        y = yr + yl
-    
-        pts = []
-        for i in range(len(x)):
-            pts.append(Point.from_dpoint(pya.DPoint(x[i]/dbu, y[i]/dbu)))
-        #small_one = core.Boundary(points)
-        
-        polygon = Polygon(pts)
-        shapes(LayerSiN).insert(polygon)
-        
-        ##big one
-        r_up = []
-        r_down = []
-        for k in range(len(theta_up)):
-          r_up = r_up + [N*lambda_0 / ( self.n_e*( 1 - e*cos(float(theta_up[k])) )) + j*self.period + 2*spacing+ wl]
-        r_down = r_up[::-1]
-    
-        xr = []
-        yr = []
-        for k in range(len(theta_up)):
-          xr = xr + [r_up[k]*cos(theta_up[k])]
-          yr = yr + [r_up[k]*sin(theta_up[k])]
-    
-        xl = []
-        yl = []
-        for k in range(len(theta_down)):
-          xl = xl + [(r_down[k] + wh)*cos(theta_down[k])]
-          yl = yl + [(r_down[k] + wh)*sin(theta_down[k])]
-    
-        x = xr + xl
-        y = yr + yl
-        
-        pts = []
-        for i in range(len(x)):
-            pts.append(Point.from_dpoint(pya.DPoint(x[i]/dbu, y[i]/dbu)))
-        
-        polygon = Polygon(pts)
-        shapes(LayerSiN).insert(polygon)
-      
-    # Taper section
-    r_up = []
-    r_down = []
-    for k in range(len(theta_up)):  
-      r_up = r_up + [N*lambda_0 / ( self.n_e*( 1 - e*cos(float(theta_up[k])) ))]
-    r_down = r_up[::-1]
-     
-    xl = []
-    yl = []  
-    for k in range(len(theta_down)):
-      xl = xl + [(r_down[k])*cos(theta_down[k])]
-      yl = yl + [(r_down[k])*sin(theta_down[k])]
-      
-    yr = [self.t/2., self.t/2., -self.t/2., -self.t/2.]
-    
-    yl_abs = []
-    for k in range(len(yl)):
-      yl_abs = yl_abs + [abs(yl[k])]
-    
-    y_max = max(yl_abs)
-    iy_max = yl_abs.index(y_max)
-      
-    L_o = (y_max - self.t/2)/tan((pi/180)*self.angle_e/2)
-      
-    xr = [L_o+xl[iy_max], 0, 0, L_o+xl[iy_max]]
-     
-    x = xr + xl
-    y = yr + yl  
 
-    pts = []
-    for i in range(len(x)):
-      pts.append(Point.from_dpoint(pya.DPoint(x[i]/dbu, y[i]/dbu)))
-    
-    polygon = Polygon(pts)
-    shapes(LayerSiN).insert(polygon)
+    # Draw coupler grating, and the taper.
+    for polygon in focusing_grating(N*lambda_0, self.n_e, e, self.angle_e, self.period, spacing, wl, wh, gc_number, self.t, dbu):
+      shapes(LayerSiN).insert(polygon)
 
 
     # Pin on the waveguide:
@@ -521,6 +423,188 @@ class swg_fc(pya.PCellDeclarationHelper):
     shapes(LayerDevRecN).insert(box1)
 
 
+def phc_boolean(slab, hole, dbu, tile_size = None, threads = None):
+  # returns slab - hole, as a pya.Region
+  # dbu: database unit of the layout
+  # tile_size: tile width and height (microns), 0 for a single flat boolean
+  # threads: number of threads used to process the tiles
+  # (by default, from the environment, see below: a flat boolean)
+  #
+  # Tiled version: the boolean runs on tiles in the KLayout tiling processor.
+  # A tile edge through a hole would add vertices where it crosses the hole,
+  # rounded to the grid, so the holes crossing the tile edges are subtracted
+  # first, flat, from their bounding boxes, and the tiles only process the
+  # rest of the slab.  The tiles start on the slab corner and are a whole
+  # number of dbu: for a rectilinear slab, all the cuts are on the grid, and
+  # the geometry is identical (XOR) to the flat boolean.
+  #
+  # The extra work makes the tiled boolean slower than the flat one on a
+  # single core (about 2x, from 400 to 26000 holes, Benchmarks/Benchmark -
+  # PhC boolean.lym), so it is only used if it is set in the environment,
+  # for all the PCells (the layouts don't depend on it), after measuring it
+  # faster with the benchmark on the machine:
+  #   SIEPIC_EBEAM_PHC_TILE_SIZE    tile size, microns (0: flat, the default)
+  #   SIEPIC_EBEAM_PHC_THREADS      threads (1 by default)
+  if tile_size is None:
+    tile_size = float(os.environ.get("SIEPIC_EBEAM_PHC_TILE_SIZE", "0"))
+  if threads is None:
+    threads = int(os.environ.get("SIEPIC_EBEAM_PHC_THREADS", "1"))
+  if tile_size <= 0:
+    return slab - hole
+
+  tile = max(1, int(round(tile_size/dbu)))
+  bbox = slab.bbox()
+
+  # the holes on the tile edges (1 dbu wide boxes), and any hole touching their bounding boxes
+  edges = pya.Region()
+  for x in range(bbox.left + tile, bbox.right, tile):
+    edges.insert(pya.Box(x, bbox.bottom, x+1, bbox.top))
+  for y in range(bbox.bottom + tile, bbox.top, tile):
+    edges.insert(pya.Box(bbox.left, y, bbox.right, y+1))
+  cut = hole.interacting(edges)
+  while True:
+    more = hole.interacting(cut.extents())
+    if more.count() == cut.count():
+      break
+    cut = more
+  boxes = cut.extents().merged()
+  phc = (slab & boxes) - cut
+
+  # the rest of the slab, in tiles
+  rest = slab - boxes
+  tiles = pya.Region()
+  tp = pya.TilingProcessor()
+  tp.dbu = dbu
+  tp.threads = max(1, threads)
+  tp.tile_size(tile*dbu, tile*dbu)
+  tp.tile_origin(bbox.left*dbu, bbox.bottom*dbu)
+  tp.input("slab", rest)
+  tp.input("hole", hole)
+  tp.output("phc", tiles)
+  tp.queue("_output(phc, (slab & _tile) - hole)")
+  tp.execute("Photonic crystal boolean")
+  return phc + tiles
+
+
+def layout_phc_holes(cell, layer, slab, hole_poly, sites, defects, a, flatten = False):
+  # subtract a triangular lattice of holes from a slab, and place it in the cell
+  # cell: cell into which to place the photonic crystal
+  # layer: layer index to draw on
+  # slab: pya.Region of the slab, with any trenches already removed
+  # hole_poly: polygon of a single hole, centred at the origin
+  # sites: list of [x, y] regular lattice holes, in dbu
+  # defects: list of [x, y] shifted (defect) holes, in dbu
+  # a: lattice constant, in dbu
+  # flatten: True to subtract every hole from the slab as flat polygons
+  #
+  # Hierarchical version: a sub-cell contains one lattice tile (an a by
+  # a*sqrt(3)/2 box with the hole removed), and each run of regular holes in a
+  # row is placed as a CellInstArray of that tile.  Defect holes, and holes on
+  # the slab edges or trenches, are subtracted from the rest of the slab.
+  # The tile cell is shared by the PCells of the layout with the same tile
+  # (pcell_utils.gratings.shared_cell).
+  #
+  # The layer is the slab, so a hole can only be placed as the slab tile
+  # around it.  The defect holes are shifted by a good part of a period
+  # (e.g. S1x = 0.28 um in H0c, for a = 0.744 um), out of their tiles and
+  # into the neighbouring ones, so they, and the regular holes whose tiles
+  # they reach, are cut flat; there are only a few of them, around the cavity.
+  #
+  # The tiles are placed at a whole number of dbu: if a isn't one, the
+  # rounded hole positions are not evenly spaced, and the lattice is flat.
+
+  # the slab is merged first: the edges inside overlapping slab shapes (e.g.
+  # the suspension beams) would otherwise add rounded vertices where they
+  # cross the holes, in the flat boolean only
+  slab = slab.merged()
+
+  # integer hole positions, with the same rounding as the flat version
+  sites = [pya.Trans(Trans.R0, x, y).disp for x, y in sites]
+  defects = [pya.Trans(Trans.R0, x, y).disp for x, y in defects]
+
+  dbu = cell.layout().dbu
+  pitch = int(round(a))
+  row = a*math.sqrt(3)/2
+  tile_l = pitch//2
+  tile_r = pitch - tile_l
+  tile_h = int(math.ceil(math.ceil(row)/2))  # neighbouring rows overlap by up to 1 dbu
+  hole_h = math.floor(row) - tile_h
+  hb = hole_poly.bbox()
+
+  # the tiles only reproduce the flat geometry if each hole stays inside its
+  # own tile, and the holes are evenly spaced
+  if hb.left <= -tile_l or hb.right >= tile_r or hb.bottom <= -hole_h or hb.top >= hole_h:
+    flatten = True
+  if integer_pitch(a) is None:
+    flatten = True
+
+  if flatten:
+    hole = pya.Region()
+    for p in sites + defects:
+      hole.insert(hole_poly.transformed(pya.Trans(p)))
+    cell.shapes(layer).insert(phc_boolean(slab, hole, dbu))
+    return
+
+  def tile_box(x0, x1, y):
+    return pya.Box(x0-tile_l, y-tile_h, x1+tile_r, y+tile_h)
+
+  def inside(box):
+    return (pya.Region(box) - slab).is_empty()
+
+  # regular holes whose tile touches a shifted hole are drawn flat
+  defect_boxes = [hb.moved(p) for p in defects]
+  flat = list(defects)
+  rows = {}
+  for p in sites:
+    box = tile_box(p.x, p.x, p.y)
+    if any(box.overlaps(d) for d in defect_boxes):
+      flat.append(p)
+    else:
+      rows.setdefault(p.y, []).append(p.x)
+
+  # group the regular holes into runs along each row
+  runs = []
+  for y in rows:
+    xs = sorted(rows[y])
+    run = [xs[0]]
+    for x in xs[1:]:
+      if x - run[-1] == pitch:
+        run.append(x)
+      else:
+        runs.append([y, run])
+        run = [x]
+    runs.append([y, run])
+
+  # runs reaching outside the slab (edges, trenches) hand their end holes to the flat part
+  tiled = []
+  for y, run in runs:
+    while run and not inside(tile_box(run[0], run[-1], y)):
+      if not inside(tile_box(run[0], run[0], y)):
+        flat.append(pya.Vector(run.pop(0), y))
+      elif not inside(tile_box(run[-1], run[-1], y)):
+        flat.append(pya.Vector(run.pop(), y))
+      else:
+        flat += [pya.Vector(x, y) for x in run]
+        run = []
+    if run:
+      tiled.append([y, run])
+
+  # place the tiles in the top cell, from a sub-cell with one lattice tile
+  covered = pya.Region()
+  if tiled:
+    tile = pya.Region(tile_box(0, 0, 0)) - pya.Region(hole_poly)
+    tile_cell = period_cell(cell.layout(), layer, list(tile.each()), "PhC_hole_tile")
+  for y, run in tiled:
+    t = pya.Trans(Trans.R0, run[0], y)
+    cell.insert(pya.CellInstArray(tile_cell.cell_index(), t, pya.Point(pitch, 0), pya.Point(0, 0), len(run), 1))
+    covered.insert(tile_box(run[0], run[-1], y))
+
+  hole = pya.Region()
+  for p in flat:
+    hole.insert(hole_poly.transformed(pya.Trans(p)))
+  cell.shapes(layer).insert(phc_boolean(slab - covered, hole, dbu))
+
+
 class H0c(pya.PCellDeclarationHelper):
   """
   Input: length, width
@@ -537,7 +621,7 @@ class H0c(pya.PCellDeclarationHelper):
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.179)
     self.param("wg_dis", self.TypeInt, "Waveguide distance (number of holes)", default = 3)
     self.param("n_bus", self.TypeInt, "Bus number, 1 or 2 ", default = 2)
-    self.param("n_vertices", self.TypeInt, "Vertices of a hole", default = 32)                                
+    self.param("n_vertices", self.TypeInt, "Vertices of a hole (0: from the error budget)", default = 0)                                
     self.param("S1x", self.TypeDouble, "S1x shift", default = 0.28)     
     self.param("S2x", self.TypeDouble, "S2x shift", default = 0.193)     
     self.param("S3x", self.TypeDouble, "S3x shift", default = 0.194)     
@@ -546,8 +630,9 @@ class H0c(pya.PCellDeclarationHelper):
     self.param("S1y", self.TypeDouble, "S1y shift", default = -0.016)
     self.param("S2y", self.TypeDouble, "S2y shift", default = 0.134)
     self.param("etch_condition", self.TypeInt, "etch = 1 if etch box, etch = 2 if no etch box", default = 1)  
+    self.param("flatten", self.TypeBoolean, "Flatten the hole lattice (no sub-cells; also if a is not a whole number of dbu)", default = False)
     
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -582,7 +667,7 @@ class H0c(pya.PCellDeclarationHelper):
     a = self.a/dbu
     r = self.r/dbu
     wg_dis = self.wg_dis+1
-    n_vertices = self.n_vertices
+    n_vertices = self.n_vertices or circle_points(r, dbu)
     n_bus = self.n_bus
     n = int(math.ceil(self.n/2))
     Sx = [self.S1x,self.S2x,self.S3x,self.S4x,self.S5x]
@@ -609,7 +694,6 @@ class H0c(pya.PCellDeclarationHelper):
     # Define Si slab and hole region for future subtraction
     Si_slab = pya.Region()
     Si_slab.insert(pya.Box(-length_anchor_x/2, -length_anchor_y/2, length_anchor_x/2, length_anchor_y/2))
-    hole = pya.Region()
     hole_r = r
     trench = pya.Region()
     
@@ -639,42 +723,15 @@ class H0c(pya.PCellDeclarationHelper):
     hole_cell = circle(0,0,hole_r)
     hole_poly = pya.Polygon(hole_cell)  
 
-    for j in range(-n_y,n_y+1):
-      if j%2 == 0 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None 
-          elif j == 0 and i in (1,-1,2,-2,3,-3,4,-4,5,-5):
-            hole_x = abs(i)/i*(abs(i)-0.5+Sx[abs(i)-1])*a
-            hole_y = 0 
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t)           
-          elif i!=0:
-            hole_x = abs(i)/i*(abs(i)-0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-      elif j%2 == 1 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None
-          elif i == 0 and j in (1,-1,3,-3):
-            hole_x = 0
-            hole_y = j*a*(math.sqrt(3)/2)+abs(j)/j*a*Sy[abs(j)-1]
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-          else:  
-            hole_x = i*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-            
-    phc = Si_slab - hole - trench
-    self.cell.shapes(LayerSiN).insert(phc)
+    i, j, x, y = triangular_lattice(n_x, n_y)
+    keep = (j != wg_dis)
+    if n_bus == 2:
+      keep &= ~((j == -wg_dis) & (i > 3))
+    shifted = shift_sites(i, j, x, y, cavity_shifts(Sx, Sy))
+    sites = lattice_points(x, y, a, keep & ~shifted)
+    defects = lattice_points(x, y, a, keep & shifted)
+
+    layout_phc_holes(self.cell, LayerSiN, Si_slab - trench, hole_poly, sites, defects, a, self.flatten)
     
     if etch_condition == 1 :
       box_etch = pya.Box(-(length_slab_x/2-3000), -(length_slab_y/2-3000), length_slab_x/2-3000, length_slab_y/2-3000)
@@ -731,13 +788,14 @@ class L3c(pya.PCellDeclarationHelper):
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.181)
     self.param("wg_dis", self.TypeInt, "Waveguide distance (number of holes)", default = 3) 
     self.param("n_bus", self.TypeInt, "Bus number, 1 or 2 ", default = 2)
-    self.param("n_vertices", self.TypeInt, "Vertices of a hole", default = 32)            
+    self.param("n_vertices", self.TypeInt, "Vertices of a hole (0: from the error budget)", default = 0)            
     self.param("S1x", self.TypeDouble, "S1x shift", default = 0.337)     
     self.param("S2x", self.TypeDouble, "S2x shift", default = 0.27)     
     self.param("S3x", self.TypeDouble, "S3x shift", default = 0.088)     
     self.param("S4x", self.TypeDouble, "S4x shift", default = 0.323)
     self.param("S5x", self.TypeDouble, "S5x shift", default = 0.173)
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    self.param("flatten", self.TypeBoolean, "Flatten the hole lattice (no sub-cells; also if a is not a whole number of dbu)", default = False)
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -772,7 +830,7 @@ class L3c(pya.PCellDeclarationHelper):
     a = self.a/dbu
     r = self.r/dbu
     wg_dis = self.wg_dis+1
-    n_vertices = self.n_vertices
+    n_vertices = self.n_vertices or circle_points(r, dbu)
     n_bus = self.n_bus    
     n = int(math.ceil(self.n/2))
     Sx = [self.S1x,self.S2x,self.S3x,self.S4x,self.S5x]
@@ -796,7 +854,6 @@ class L3c(pya.PCellDeclarationHelper):
     # Define Si slab and hole region for future subtraction
     Si_slab = pya.Region()
     Si_slab.insert(pya.Box(-length_anchor_x/2, -length_anchor_y/2, length_anchor_x/2, length_anchor_y/2))
-    hole = pya.Region()
     hole_r = r
     trench = pya.Region()
     
@@ -826,38 +883,15 @@ class L3c(pya.PCellDeclarationHelper):
     hole_cell = circle(0,0,hole_r)
     hole_poly = pya.Polygon(hole_cell)  
 
-    for j in range(-n_y,n_y+1):
-      if j%2 == 0 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None
-          elif j == 0 and i in (-1,0,1):
-            None
-          elif j == 0 and i in (2,-2,3,-3,4,-4,5,-5,6,-6):
-            hole_x = (i+(abs(i)/i)*Sx[abs(i)-2])*a
-            hole_y = 0 
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t)           
-          else:
-            hole_x = i*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-      elif j%2 == 1 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None
-          elif i != 0:
-            hole_x = abs(i)/i*(abs(i)-0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t)  
-            
-    phc = Si_slab - hole - trench
-    self.cell.shapes(LayerSiN).insert(phc)
+    i, j, x, y = triangular_lattice(n_x, n_y, half_rows = 1)
+    keep = (j != wg_dis) & ~((j == 0) & (abs(i) <= 1))
+    if n_bus == 2:
+      keep &= ~((j == -wg_dis) & (i > 3))
+    shifted = shift_sites(i, j, x, y, cavity_shifts(Sx, x_start = 2))
+    sites = lattice_points(x, y, a, keep & ~shifted)
+    defects = lattice_points(x, y, a, keep & shifted)
+
+    layout_phc_holes(self.cell, LayerSiN, Si_slab - trench, hole_poly, sites, defects, a, self.flatten)
     box_etch = pya.Box(-(length_slab_x/2-3000), -(length_slab_y/2-3000), length_slab_x/2-3000, length_slab_y/2-3000)
     self.cell.shapes(LayerEtch).insert(box_etch)
 
@@ -912,7 +946,7 @@ class H0c_oxide(pya.PCellDeclarationHelper):
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.125)
     self.param("wg_dis", self.TypeInt, "Waveguide distance (number of holes)", default = 3)
     self.param("n_bus", self.TypeInt, "Bus number, 1 or 2 ", default = 2)
-    self.param("n_vertices", self.TypeInt, "Vertices of a hole", default = 20)                                
+    self.param("n_vertices", self.TypeInt, "Vertices of a hole (0: from the error budget)", default = 0)                                
     self.param("S1x", self.TypeDouble, "S1x shift", default = 0.28)     
     self.param("S2x", self.TypeDouble, "S2x shift", default = 0.193)     
     self.param("S3x", self.TypeDouble, "S3x shift", default = 0.194)     
@@ -920,7 +954,8 @@ class H0c_oxide(pya.PCellDeclarationHelper):
     self.param("S5x", self.TypeDouble, "S5x shift", default = 0.113)
     self.param("S1y", self.TypeDouble, "S1y shift", default = -0.016)
     self.param("S2y", self.TypeDouble, "S2y shift", default = 0.134)
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    self.param("flatten", self.TypeBoolean, "Flatten the hole lattice (no sub-cells; also if a is not a whole number of dbu)", default = False)
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -953,7 +988,7 @@ class H0c_oxide(pya.PCellDeclarationHelper):
     a = self.a/dbu
     r = self.r/dbu
     wg_dis = self.wg_dis+1
-    n_vertices = self.n_vertices
+    n_vertices = self.n_vertices or circle_points(r, dbu)
     n_bus = self.n_bus
     n = int(math.ceil(self.n/2))
     Sx = [self.S1x,self.S2x,self.S3x,self.S4x,self.S5x]
@@ -975,7 +1010,6 @@ class H0c_oxide(pya.PCellDeclarationHelper):
     # Define Si slab and hole region for future subtraction
     Si_slab = pya.Region()
     Si_slab.insert(pya.Box(-length_slab_x/2, -length_slab_y/2, length_slab_x/2, length_slab_y/2))
-    hole = pya.Region()
     hole_r = r
 
     # function to generate points to create a circle
@@ -992,42 +1026,15 @@ class H0c_oxide(pya.PCellDeclarationHelper):
     hole_cell = circle(0,0,hole_r)
     hole_poly = pya.Polygon(hole_cell)  
 
-    for j in range(-n_y,n_y+1):
-      if j%2 == 0 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None 
-          elif j == 0 and i in (1,-1,2,-2,3,-3,4,-4,5,-5):
-            hole_x = abs(i)/i*(abs(i)-0.5+Sx[abs(i)-1])*a
-            hole_y = 0 
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t)           
-          elif i!=0:
-            hole_x = abs(i)/i*(abs(i)-0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-      elif j%2 == 1 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None
-          elif i == 0 and j in (1,-1,3,-3):
-            hole_x = 0
-            hole_y = j*a*(math.sqrt(3)/2)+abs(j)/j*a*Sy[abs(j)-1]
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-          else:  
-            hole_x = i*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-            
-    phc = Si_slab - hole
-    self.cell.shapes(LayerSiN).insert(phc)
+    i, j, x, y = triangular_lattice(n_x, n_y)
+    keep = (j != wg_dis)
+    if n_bus == 2:
+      keep &= ~((j == -wg_dis) & (i > 3))
+    shifted = shift_sites(i, j, x, y, cavity_shifts(Sx, Sy))
+    sites = lattice_points(x, y, a, keep & ~shifted)
+    defects = lattice_points(x, y, a, keep & shifted)
+
+    layout_phc_holes(self.cell, LayerSiN, Si_slab, hole_poly, sites, defects, a, self.flatten)
     
     # Pins on the waveguide:    
     pin_length = 200
@@ -1081,8 +1088,8 @@ class PhC_test(pya.PCellDeclarationHelper):
     self.param("n", self.TypeInt, "Number of holes in x and y direction", default = 5)     
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.179)
     self.param("n_sweep", self.TypeInt, "Different sizes of holes", default = 13)
-    self.param("n_vertices", self.TypeInt, "Vertices of a hole", default = 32)                                
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    self.param("n_vertices", self.TypeInt, "Vertices of a hole (0: from the error budget)", default = 0)                                
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1118,7 +1125,7 @@ class PhC_test(pya.PCellDeclarationHelper):
     # Fetch all the parameters:
     a = self.a/dbu
     r = self.r/dbu
-    n_vertices = self.n_vertices
+    n_vertices = self.n_vertices or circle_points(r, dbu)
     n = int(math.ceil(self.n/2))
     #print(n)
     n_sweep = self.n_sweep
@@ -1151,23 +1158,11 @@ class PhC_test(pya.PCellDeclarationHelper):
         else:
           ruler.insert(pya.Box(-y_height+x_offset_3, -x_width-y_offset_2+x_spacing*m, y_height+x_offset_3, x_width-y_offset_2+x_spacing*m))
         
-      for j in range(-n_y,n_y+1):
-        if j%2 == 0:
-          for i in range(-n_x,n_x+1):
-            if i!=0:
-              hole_x = abs(i)/i*(abs(i)-0.5)*a_k+x_offset
-              hole_y = j*a_k*math.sqrt(3)/2
-              hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-              hole_t = hole_poly.transformed(hole_trans)
-              hole.insert(hole_t)
-            #print(hole_t) 
-        elif j%2 == 1:
-          for i in range(-n_x,n_x+1): 
-            hole_x = i*a_k+x_offset
-            hole_y = j*a_k*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
+      i, j, x, y = triangular_lattice(n_x, n_y)
+      for hole_x, hole_y in lattice_points(x, y, a_k):
+        hole_trans = pya.Trans(Trans.R0, hole_x+x_offset,hole_y)
+        hole_t = hole_poly.transformed(hole_trans)
+        hole.insert(hole_t)
         
     phc = Si_slab - hole
     phc = phc + ruler
@@ -1187,7 +1182,7 @@ class Hole_cell_half(pya.PCellDeclarationHelper):
 
     self.param("a", self.TypeDouble, "lattice constant (microns)", default = 0.744)     
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.179)
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1222,7 +1217,7 @@ class Hole_cell_half(pya.PCellDeclarationHelper):
 
     # function to generate points to create a circle
     def hexagon_hole_half(a,r): 
-      npts = 10    
+      npts = arc_points(r, math.pi, dbu)
       theta_div = math.pi/3
       theta_div_hole = math.pi/npts
       triangle_length = a/math.sqrt(3)
@@ -1255,7 +1250,7 @@ class Hexagon_cell_half(pya.PCellDeclarationHelper):
 
     self.param("a", self.TypeDouble, "lattice constant (microns)", default = 0.744)     
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.179)
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1320,7 +1315,7 @@ class wg_triangle_tapers(pya.PCellDeclarationHelper):
     self.param("tri_height", self.TypeDouble, "Triangle Height (microns)", default = 0.426)
     self.param("taper_wg_length", self.TypeDouble, "Waveguide Length (microns)", default = 5)
     self.param("wg_width", self.TypeDouble, "Waveguide Width (microns)", default = 1)
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("silayer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1514,7 +1509,7 @@ class H0c_Test_Structure(pya.PCellDeclarationHelper):
     self.param("theta_c", self.TypeDouble, "Insertion Angle (deg)", default = 8.0)
     
     #Layer Parameters
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1619,7 +1614,7 @@ class H0c_oxide_Test_Structure(pya.PCellDeclarationHelper):
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.125)
     self.param("wg_dis", self.TypeInt, "Waveguide distance (number of holes)", default = 3)
     self.param("n_bus", self.TypeInt, "Bus number, 1 or 2 ", default = 2)
-    self.param("n_vertices", self.TypeInt, "Vertices of a hole", default = 20)                                
+    self.param("n_vertices", self.TypeInt, "Vertices of a hole (0: from the error budget)", default = 0)                                
     self.param("S1x", self.TypeDouble, "S1x shift", default = 0.28)     
     self.param("S2x", self.TypeDouble, "S2x shift", default = 0.193)     
     self.param("S3x", self.TypeDouble, "S3x shift", default = 0.194)     
@@ -1643,7 +1638,7 @@ class H0c_oxide_Test_Structure(pya.PCellDeclarationHelper):
     self.param("theta_c", self.TypeDouble, "Insertion Angle (deg)", default = 8.0)
     
     #Layer Parameters
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1764,7 +1759,7 @@ class L3c_Test_Structure(pya.PCellDeclarationHelper):
     self.param("theta_c", self.TypeDouble, "Insertion Angle (deg)", default = 8.0)
     
     #Layer Parameters
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1860,7 +1855,7 @@ class GC_to_GC_ref1(pya.PCellDeclarationHelper):
     self.param("wg_xdis", self.TypeDouble, "Waveguide x Distance (microns)", default = 5)   
     
     #Layer Parameters
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1913,10 +1908,11 @@ class PhC_W1wg(pya.PCellDeclarationHelper):
     self.param("n", self.TypeInt, "Number of holes in x and y direction", default = 30)     
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.179)
     self.param("wg_dis", self.TypeInt, "Waveguide distance (number of holes)", default = 2)
-    self.param("n_vertices", self.TypeInt, "Vertices of a hole", default = 32)    
+    self.param("n_vertices", self.TypeInt, "Vertices of a hole (0: from the error budget)", default = 0)    
     self.param("etch_condition", self.TypeInt, "Etch = 1, No Etch = 2", default = 1)                            
+    self.param("flatten", self.TypeBoolean, "Flatten the hole lattice (no sub-cells; also if a is not a whole number of dbu)", default = False)
     
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -1946,7 +1942,7 @@ class PhC_W1wg(pya.PCellDeclarationHelper):
     a = self.a/dbu
     r = self.r/dbu
     wg_dis = self.wg_dis+1
-    n_vertices = self.n_vertices
+    n_vertices = self.n_vertices or circle_points(r, dbu)
     n = int(math.ceil(self.n/2))
     n_bus = 1
     etch_condition = self.etch_condition
@@ -1968,7 +1964,6 @@ class PhC_W1wg(pya.PCellDeclarationHelper):
     # Define Si slab and hole region for future subtraction
     Si_slab = pya.Region()
     Si_slab.insert(pya.Box(-length_slab_x/2, -length_slab_y/2, length_slab_x/2, length_slab_y/2))
-    hole = pya.Region()
     hole_r = r
 
     # add suspension beams
@@ -1997,42 +1992,15 @@ class PhC_W1wg(pya.PCellDeclarationHelper):
     hole_cell = circle(0,0,hole_r)
     hole_poly = pya.Polygon(hole_cell)  
 
-    for j in range(-n_y,n_y+1):
-      if j%2 == 0 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None 
-          elif j == 0 and i in (1,-1,2,-2,3,-3,4,-4,5,-5):
-            hole_x = abs(i)/i*(abs(i)-0.5+Sx[abs(i)-1])*a
-            hole_y = 0 
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t)           
-          elif i!=0:
-            hole_x = abs(i)/i*(abs(i)-0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-      elif j%2 == 1 and j != wg_dis:
-        for i in range(-n_x,n_x+1):
-          if j == -wg_dis and i > 3 and n_bus == 2:
-            None
-          elif i == 0 and j in (1,-1,3,-3):
-            hole_x = 0
-            hole_y = j*a*(math.sqrt(3)/2)+abs(j)/j*a*Sy[abs(j)-1]
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-          else:  
-            hole_x = i*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t = hole_poly.transformed(hole_trans)
-            hole.insert(hole_t) 
-            
-    phc = Si_slab - hole
-    self.cell.shapes(LayerSiN).insert(phc)
+    i, j, x, y = triangular_lattice(n_x, n_y)
+    keep = (j != wg_dis)
+    if n_bus == 2:
+      keep &= ~((j == -wg_dis) & (i > 3))
+    shifted = shift_sites(i, j, x, y, cavity_shifts(Sx, Sy))
+    sites = lattice_points(x, y, a, keep & ~shifted)
+    defects = lattice_points(x, y, a, keep & shifted)
+
+    layout_phc_holes(self.cell, LayerSiN, Si_slab, hole_poly, sites, defects, a, self.flatten)
     if etch_condition == 1:
       box_etch = pya.Box(-(length_slab_x/2-3000), -(length_slab_y/2-6000), length_slab_x/2-3000, length_slab_y/2-6000)
       self.cell.shapes(LayerEtch).insert(box_etch)
@@ -2090,7 +2058,7 @@ class PhC_W1wg_reference(pya.PCellDeclarationHelper):
     self.param("n", self.TypeInt, "Number of holes in x and y direction", default = 30)     
     self.param("r", self.TypeDouble, "hole radius (microns)", default = 0.179)
     self.param("wg_dis", self.TypeInt, "Waveguide distance (number of holes)", default = 2)
-    self.param("n_vertices", self.TypeInt, "Vertices of a hole", default = 32)    
+    self.param("n_vertices", self.TypeInt, "Vertices of a hole (0: from the error budget)", default = 0)    
     self.param("etch_condition", self.TypeInt, "Etch = 1, No Etch = 2", default = 1)   
     self.param("phc_xdis", self.TypeDouble, "Distance to middle of phc", default = 35)
     
@@ -2104,7 +2072,7 @@ class PhC_W1wg_reference(pya.PCellDeclarationHelper):
     self.param("taper_wg_length", self.TypeDouble, "Taper Length (microns)", default = 5) 
     
     #Layer Parameters
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -2199,7 +2167,7 @@ class H0c_new(pya.PCellDeclarationHelper):
     self.param("S1y", self.TypeDouble, "S1y shift", default = -0.016)
     self.param("S2y", self.TypeDouble, "S2y shift", default = 0.134)
     self.param("bus_number",  self.TypeInt, "2 for double, 1 for single, max 2", default = 2)
-    TECHNOLOGY = get_technology_by_name('EBeam')
+    TECHNOLOGY = cached_technology('EBeam')
     self.param("layer", self.TypeLayer, "Layer", default = TECHNOLOGY['Waveguide'])
     self.param("pinrec", self.TypeLayer, "PinRec Layer", default = TECHNOLOGY['PinRec'])
     self.param("devrec", self.TypeLayer, "DevRec Layer", default = TECHNOLOGY['DevRec'])
@@ -2249,7 +2217,7 @@ class H0c_new(pya.PCellDeclarationHelper):
     
     #function to creat polygon pts for right half of a hole in a hexagon unit cell
     def hexagon_hole_half(a,r): 
-      npts = 10    
+      npts = arc_points(r, math.pi, dbu)
       theta_div = math.pi/3
       theta_div_hole = math.pi/npts
       triangle_length = a/math.sqrt(3)
@@ -2261,7 +2229,7 @@ class H0c_new(pya.PCellDeclarationHelper):
       return pts
     
     def hexagon_shifthole_half(a,r): 
-      npts = 10    
+      npts = arc_points(r, math.pi, dbu)
       theta_div = math.pi/3
       theta_div_hole = math.pi/npts
       triangle_length = a*1.235/math.sqrt(3)
@@ -2299,90 +2267,28 @@ class H0c_new(pya.PCellDeclarationHelper):
     hole_shiftcell_poly_1 = hole_shiftcell_poly_0.transformed(hole_trans)
         
     #create the photonic crystal with shifts and waveguides
-    for j in range(-n+1,n):
-      if j%2 == 0:
-        for i in range(-n,n+1):
-          #waveguide          
-          if (j == k*wg_dis and i > 3) or (j == wg_dis and i != 0):
-            hole_x = abs(i)/i*(abs(i)-0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t_0 = hexagon_cell_poly_0.transformed(hole_trans)
-            hole_t_1 = hexagon_cell_poly_1.transformed(hole_trans)            
-            hole.insert(hole_t_0)
-            hole.insert(hole_t_1)
-          #filling the edges with half cell
-          elif i in (-n,n) and wg_dis%2 == 1:
-            hole_x = abs(i)/i*(abs(i)+0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            if i == -n:         
-              hole_t = hole_cell_poly_0.transformed(hole_trans)
-            else:
-              hole_t = hole_cell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t)
-            hole_x = abs(i)/i*(abs(i)-0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t_0 = hole_cell_poly_0.transformed(hole_trans)
-            hole_t_1 = hole_cell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t_0)  
-            hole.insert(hole_t_1)             
-          #x shifts
-          elif j == 0 and i in (1,-1,2,-2,3,-3,4,-4,5,-5):
-            hole_x = abs(i)/i*(abs(i)-0.5+Sx[abs(i)-1])*a
-            hole_y = 0 
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t_0 = hole_shiftcell_poly_0.transformed(hole_trans)
-            hole_t_1 = hole_shiftcell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t_0)  
-            hole.insert(hole_t_1)                    
-          elif i!=0:
-            hole_x = abs(i)/i*(abs(i)-0.5)*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t_0 = hole_cell_poly_0.transformed(hole_trans)
-            hole_t_1 = hole_cell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t_0)  
-            hole.insert(hole_t_1)
-      elif j%2 == 1:
-        for i in range(-n,n+1):
-          #waveguide
-          if (j == k*wg_dis and i > 3) or j == wg_dis:
-            hole_x = i*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t_0 = hexagon_cell_poly_0.transformed(hole_trans)
-            hole_t_1 = hexagon_cell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t_0)
-            hole.insert(hole_t_1)
-          #filling the edges with half cell
-          elif wg_dis%2 == 0 and i in (-n,n):
-            hole_x = i*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y) 
-            if i == -n:           
-              hole_t = hole_cell_poly_0.transformed(hole_trans)
-            else:
-              hole_t = hole_cell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t)               
-          #y shifts
-          elif i == 0 and j in (1,-1,3,-3):
-            hole_x = 0
-            hole_y = j*a*(math.sqrt(3)/2)+abs(j)/j*a*Sy[abs(j)-1]
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t_0 = hole_shiftcell_poly_0.transformed(hole_trans)
-            hole_t_1 = hole_shiftcell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t_0)  
-            hole.insert(hole_t_1)
-          else:  
-            hole_x = i*a
-            hole_y = j*a*math.sqrt(3)/2
-            hole_trans = pya.Trans(Trans.R0, hole_x,hole_y)
-            hole_t_0 = hole_cell_poly_0.transformed(hole_trans)
-            hole_t_1 = hole_cell_poly_1.transformed(hole_trans)
-            hole.insert(hole_t_0)  
-            hole.insert(hole_t_1)
+    i, j, x, y = triangular_lattice(n, n-1)
+    half = (j%2 == 0)
+    wg = ((j == k*wg_dis) & (i > 3)) | (j == wg_dis)
+    edge = ~wg & (abs(i) == n) & (j%2 != wg_dis%2)
+    shifted = shift_sites(i, j, x, y, cavity_shifts(Sx, Sy), ~wg & ~edge)
+
+    def insert_cells(polys, mask, dx = 0):
+      for hole_x, hole_y in lattice_points(x, y, a, mask):
+        hole_trans = pya.Trans(Trans.R0, hole_x+dx,hole_y)
+        for poly in polys:
+          hole.insert(poly.transformed(hole_trans))
+
+    #waveguide
+    insert_cells([hexagon_cell_poly_0, hexagon_cell_poly_1], wg)
+    #x and y shifts
+    insert_cells([hole_shiftcell_poly_0, hole_shiftcell_poly_1], shifted)
+    insert_cells([hole_cell_poly_0, hole_cell_poly_1], ~wg & ~shifted & ~(edge & ~half))
+    #filling the edges with half cell
+    insert_cells([hole_cell_poly_0], edge & half & (i < 0), -a)
+    insert_cells([hole_cell_poly_1], edge & half & (i > 0), a)
+    insert_cells([hole_cell_poly_0], edge & ~half & (i < 0))
+    insert_cells([hole_cell_poly_1], edge & ~half & (i > 0))
     
     #print(hole_t_0)
     box_l = a/2